@@ -0,0 +1,70 @@
+"""
+Benchmarks of the jwt_devices hot paths. Run them from the repository root, e.g. `python -m benchmarks.decode`.
+"""
+import time
+from collections import namedtuple
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+
+
+def setup_django(**overrides):
+    if settings.configured:
+        return
+
+    options = dict(
+        DATABASES={
+            "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}
+        },
+        SECRET_KEY="not very secret in benchmarks",
+        INSTALLED_APPS=(
+            "django.contrib.auth",
+            "django.contrib.contenttypes",
+            "rest_framework",
+            "rest_framework_jwt",
+            "jwt_devices",
+        ),
+        PASSWORD_HASHERS=("django.contrib.auth.hashers.MD5PasswordHasher",),
+    )
+    options.update(overrides)
+    settings.configure(**options)
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+def ops_per_second(func, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return number / (time.perf_counter() - start)
+
+
+Measurement = namedtuple("Measurement", ["ops_per_second", "p50", "p99", "queries"])
+
+
+def measure(func, number, query_samples=100):
+    """
+    Calls `func` `number` times and returns the throughput, the median and 99th percentile latency in milliseconds
+    and the average number of queries per call, counted in a separate run of `query_samples` calls.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    latencies = []
+    for _ in range(number):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+
+    with CaptureQueriesContext(connection) as context:
+        for _ in range(query_samples):
+            func()
+
+    latencies.sort()
+    return Measurement(
+        ops_per_second=number / sum(latencies),
+        p50=latencies[len(latencies) // 2] * 1000,
+        p99=latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1000,
+        queries=len(context.captured_queries) / query_samples,
+    )
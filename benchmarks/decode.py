@@ -0,0 +1,61 @@
+"""
+Compares jwt_devices_decode_handler with the previous implementation decoding the token twice, once without
+verification to read the `device_id` claim and once more with the device secret.
+
+    python -m benchmarks.decode [--number 20000] [--claims 0,50,500]
+"""
+import argparse
+
+from benchmarks import ops_per_second, setup_django
+
+
+def double_decode_handler(token):
+    import jwt
+    from rest_framework_jwt.settings import api_settings as rfj_settings
+
+    from jwt_devices.utils import jwt_devices_get_secret_key
+
+    unverified_payload = jwt.decode(token, None, False)
+    return jwt.decode(
+        token,
+        jwt_devices_get_secret_key(unverified_payload),
+        rfj_settings.JWT_VERIFY,
+        options={"verify_exp": rfj_settings.JWT_VERIFY_EXPIRATION},
+        leeway=rfj_settings.JWT_LEEWAY,
+        audience=rfj_settings.JWT_AUDIENCE,
+        issuer=rfj_settings.JWT_ISSUER,
+        algorithms=[rfj_settings.JWT_ALGORITHM]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--claims", default="0,50,500", help="numbers of extra payload claims to benchmark")
+    args = parser.parse_args()
+
+    # keep the secret in memory, so the benchmark measures token parsing and verification only
+    setup_django(JWT_DEVICES={"JWT_DEVICES_SECRET_STORE": "jwt_devices.stores.LocalMemorySecretStore"})
+
+    from django.contrib.auth import get_user_model
+
+    from jwt_devices.models import Device
+    from jwt_devices.utils import jwt_devices_decode_handler, jwt_devices_encode_handler, jwt_devices_payload_handler
+
+    user = get_user_model().objects.create_user("benchmark", "benchmark@example.com", "password")
+    device = Device.objects.create(user=user, name="benchmark")
+
+    print("{:>8} {:>10} {:>16} {:>16} {:>8}".format("claims", "bytes", "double decode/s", "single parse/s", "speedup"))
+    for claims in [int(number) for number in args.claims.split(",")]:
+        payload = jwt_devices_payload_handler(user, device=device)
+        payload.update({"claim_{}".format(index): "value {}".format(index) for index in range(claims)})
+        token = jwt_devices_encode_handler(payload, device=device)
+        assert double_decode_handler(token) == jwt_devices_decode_handler(token)
+
+        double = ops_per_second(lambda: double_decode_handler(token), args.number)
+        single = ops_per_second(lambda: jwt_devices_decode_handler(token), args.number)
+        print("{:>8} {:>10} {:>16.0f} {:>16.0f} {:>7.2f}x".format(claims, len(token), double, single, single / double))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Measures the import time of the jwt_devices entry points with `python -X importtime`, after Django is set up.
+
+    python -m benchmarks.imports [jwt_devices.utils jwt_devices.authentication ...]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ENTRY_POINTS = ["jwt_devices.utils", "jwt_devices.authentication", "jwt_devices.middleware", "jwt_devices.views"]
+MARKER = "-- jwt_devices benchmark --"
+SCRIPT = """
+import sys
+from benchmarks import setup_django
+setup_django()
+sys.stderr.write({marker!r} + "\\n")
+import {module}
+{code}
+"""
+
+
+def measure_imports(module, code=""):
+    """
+    Imports `module` and runs `code` in a new interpreter and returns the cumulative import time in microseconds of
+    every module imported after Django was set up.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT.format(marker=MARKER, module=module, code=code)],
+        cwd=root, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+
+    imports = {}
+    for line in output.split(MARKER, 1)[1].splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _self, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    args = parser.parse_args()
+
+    print("{:>30} {:>10} {:>8}".format("module", "ms", "modules"))
+    for module in args.modules:
+        imports = measure_imports(module)
+        print("{:>30} {:>10.1f} {:>8}".format(module, imports.get(module, 0) / 1000, len(imports)))
+
+
+if __name__ == "__main__":
+    main()
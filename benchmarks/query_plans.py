@@ -0,0 +1,96 @@
+"""
+Prints the query plans of the Device queries before and after the 0003_device_indexes migration.
+
+    python -m benchmarks.query_plans [--devices 100000] [--users 1000]
+"""
+import argparse
+import random
+from datetime import timedelta
+
+from benchmarks import setup_django
+
+
+def get_device_model(migration):
+    """
+    Returns the Device model as of the migration, without the columns added by the later ones.
+    """
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+
+    return MigrationExecutor(connection).loader.project_state(("jwt_devices", migration)).apps.get_model(
+        "jwt_devices", "Device")
+
+
+def get_queries(Device):
+    from django.utils import timezone
+
+    from jwt_devices.settings import api_settings
+
+    user_id = 1
+    expired = Device.objects.filter(
+        last_request_datetime__lt=timezone.now() - api_settings.JWT_PERMANENT_TOKEN_EXPIRATION_DELTA)
+    return [
+        ("list devices of a user", Device.objects.filter(user_id=user_id).order_by("-last_request_datetime")),
+        ("log out a device", Device.objects.filter(user_id=user_id, id=1)),
+        ("find expired devices", expired.values_list("pk", flat=True)),
+        ("find a chunk of expired devices", expired.filter(pk__gt=1000).order_by("pk").values_list("pk", flat=True)),
+    ]
+
+
+def explain(queryset):
+    from django.db import connection
+
+    sql, params = queryset.query.sql_with_params()
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return "\n".join("    " + " ".join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def print_plans(title, Device):
+    print("=== {} ===".format(title))
+    for name, queryset in get_queries(Device):
+        print("{}:\n{}".format(name, explain(queryset)))
+
+
+def populate(Device, devices, users):
+    from django.utils import timezone
+
+    User = Device._meta.get_field("user").related_model
+    User.objects.bulk_create([User(username="user{}".format(index)) for index in range(users)])
+    user_ids = list(User.objects.values_list("pk", flat=True))
+    now = timezone.now()
+    Device.objects.bulk_create([
+        Device(
+            user_id=random.choice(user_ids), permanent_token="token{}".format(index), name="device",
+            last_request_datetime=now - timedelta(minutes=random.randint(0, 60 * 24 * 30)))
+        for index in range(devices)
+    ], batch_size=500)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    call_command("migrate", "jwt_devices", "0002", verbosity=0)
+    old_device_model = get_device_model("0002_auto_20181010_2152")
+    populate(old_device_model, args.devices, args.users)
+    if connection.vendor == "sqlite":
+        connection.cursor().execute("ANALYZE")
+
+    print_plans("before 0003_device_indexes", old_device_model)
+    call_command("migrate", "jwt_devices", verbosity=0)
+    if connection.vendor == "sqlite":
+        connection.cursor().execute("ANALYZE")
+    print_plans("after 0003_device_indexes", get_device_model("0003_device_indexes"))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,3 +7,5 @@ __copyright__ = "Copyright 2017-2018 Arabella 2018 - 2025 Roman Health Ventures"
 
 # Version synonym
 VERSION = __version__
+
+default_app_config = "jwt_devices.apps.JWTDevicesConfig"
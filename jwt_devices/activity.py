@@ -0,0 +1,184 @@
+import atexit
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import models
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from jwt_devices.models import Device
+from jwt_devices.settings import LazyInstance, api_settings, get_compiled_settings
+
+WRITE_BATCH_SIZE = 250
+
+
+def write_activity(activity, batch_size=WRITE_BATCH_SIZE):
+    """
+    Writes the {device_id: datetime} mapping to `Device.last_request_datetime` with one UPDATE ... CASE statement
+    per batch. The stored datetime is never moved back.
+    """
+    items = sorted(activity.items())
+    updated = 0
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        updated += Device.objects.filter(pk__in=[device_id for device_id, _ in batch]).update(
+            last_request_datetime=Case(
+                *[When(pk=device_id, last_request_datetime__lt=when, then=Value(when)) for device_id, when in batch],
+                default=F("last_request_datetime"),
+                output_field=models.DateTimeField()
+            )
+        )
+    return updated
+
+
+class BufferedActivityTracker(object):
+    """
+    Buffers the activity of devices in memory and writes it in bulk, once per `JWT_DEVICES_ACTIVITY_FLUSH_INTERVAL`
+    or as soon as `JWT_DEVICES_ACTIVITY_BUFFER_SIZE` devices are pending.
+    """
+
+    def __init__(self):
+        self.flush_interval = get_compiled_settings().activity_flush_interval
+        self.buffer_size = api_settings.JWT_DEVICES_ACTIVITY_BUFFER_SIZE
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._next_flush = time.monotonic() + self.flush_interval
+
+    def touch(self, device_id, when=None):
+        when = when or timezone.now()
+        key = str(device_id)
+        with self._lock:
+            previous = self._pending.get(key)
+            if previous is None or previous < when:
+                self._pending[key] = when
+            flush = len(self._pending) >= self.buffer_size or time.monotonic() >= self._next_flush
+
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the pending activity and returns the number of updated devices.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._next_flush = time.monotonic() + self.flush_interval
+
+        return write_activity(pending)
+
+
+class CacheActivityTracker(BufferedActivityTracker):
+    """
+    Buffers the activity of devices in the `JWT_DEVICES_ACTIVITY_CACHE` Django cache shared by all processes.
+    A device is recorded at most once per flush interval, and any process (including the `flush_device_activity`
+    management command) can write the activity recorded by the others.
+
+    Every event takes a number from a shared sequence before it is stored, so an event missing from the cache may
+    still be on its way. The flush only marks the events up to the first missing one as flushed, unless an event
+    recorded after it is older than `gap_timeout` seconds, and the events after it are written again by the next
+    flush.
+    """
+    key_prefix = "jwt_devices:activity:"
+    lock_timeout = 60
+    gap_timeout = 10
+
+    def __init__(self):
+        super(CacheActivityTracker, self).__init__()
+        self.cache_alias = api_settings.JWT_DEVICES_ACTIVITY_CACHE
+        # events are kept long enough to survive a few missed flushes
+        self.event_timeout = max(self.flush_interval * 10, self.lock_timeout)
+
+    @property
+    def shared_cache(self):
+        return caches[self.cache_alias]
+
+    def get_cache_key(self, *parts):
+        return self.key_prefix + ":".join(str(part) for part in parts)
+
+    def touch(self, device_id, when=None):
+        cache = self.shared_cache
+        if cache.add(self.get_cache_key("seen", device_id), True, timeout=max(self.flush_interval, 1)):
+            sequence_key = self.get_cache_key("sequence")
+            if cache.add(sequence_key, 0, timeout=None):
+                # the sequence was started again, e.g. after it was evicted, so are the flushed events
+                cache.delete(self.get_cache_key("flushed"))
+            sequence = cache.incr(sequence_key)
+            cache.set(
+                self.get_cache_key("event", sequence), (str(device_id), when or timezone.now(), time.time()),
+                timeout=self.event_timeout)
+
+        if time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        cache = self.shared_cache
+        self._next_flush = time.monotonic() + self.flush_interval
+        lock_key = self.get_cache_key("lock")
+        if not cache.add(lock_key, True, timeout=self.lock_timeout):
+            # another process is flushing right now
+            return 0
+
+        try:
+            flushed_key = self.get_cache_key("flushed")
+            last = cache.get(self.get_cache_key("sequence")) or 0
+            flushed = cache.get(flushed_key) or 0
+            if flushed > last:
+                # the sequence was started again since the previous flush
+                flushed = 0
+
+            horizon = time.time() - self.gap_timeout
+            # the last sequence number with all the events up to it read, and the first missing event after it
+            done, gap = flushed, None
+            updated = 0
+            for start in range(flushed + 1, last + 1, self.buffer_size):
+                sequences = range(start, min(start + self.buffer_size, last + 1))
+                events = cache.get_many([self.get_cache_key("event", sequence) for sequence in sequences])
+                activity = {}
+                for sequence in sequences:
+                    event = events.get(self.get_cache_key("event", sequence))
+                    if event is None:
+                        gap = gap or sequence
+                        continue
+
+                    device_id, when, recorded = event
+                    if device_id not in activity or activity[device_id] < when:
+                        activity[device_id] = when
+                    if recorded < horizon:
+                        # the events missing before an old one are lost, not on their way
+                        gap = None
+                    if gap is None:
+                        done = sequence
+                updated += write_activity(activity)
+
+                if done > flushed:
+                    cache.set(flushed_key, done, timeout=None)
+                    cache.delete_many(
+                        [self.get_cache_key("event", sequence) for sequence in range(flushed + 1, done + 1)])
+                    flushed = done
+            return updated
+        finally:
+            cache.delete(lock_key)
+
+
+def _drop_tracker(tracker):
+    atexit.unregister(tracker.flush)
+    tracker.flush()
+
+
+_activity_tracker = LazyInstance(
+    "activity_tracker", on_create=lambda tracker: atexit.register(tracker.flush), on_reset=_drop_tracker)
+
+
+def get_activity_tracker():
+    """
+    Returns the `JWT_DEVICES_ACTIVITY_TRACKER` instance, or None if tracking is disabled. The pending activity is
+    flushed when the process exits or the settings change.
+    """
+    return _activity_tracker.get()
+
+
+def track_activity(device_id):
+    tracker = get_activity_tracker()
+    if tracker is not None:
+        tracker.touch(device_id)
@@ -1,18 +1,93 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import QueryDict
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 
 from jwt_devices.models import Device
+from jwt_devices.utils import delete_devices
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using the row estimate of the planner statistics instead of COUNT(*) for unfiltered querysets on
+    PostgreSQL. Small tables, filtered querysets and the other databases are counted exactly.
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self.get_estimated_count()
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super(EstimatedCountPaginator, self).count
+        return estimate
+
+    def get_estimated_count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, "query") or queryset.query.where:
+            return None
+
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
 
 
 class DeviceAdmin(admin.ModelAdmin):
     model = Device
-    list_display = ["id", "user", "name", "created", "last_request_datetime"]
-    list_filter = ["id", "user", "name", "created", "last_request_datetime"]
-    search_fields = ["user__email", "name", "details"]
-    fields = ["id", "name", "details", "created", "last_request_datetime"]
+    list_display = ["id", "user_link", "name", "created", "last_request_datetime"]
+    list_filter = [
+        ("last_request_datetime", admin.DateFieldListFilter),
+        ("created", admin.DateFieldListFilter),
+    ]
+    list_select_related = ["user"]
+    search_fields = ["^name", "^details", "^user__email"]
+    fields = ["id", "user", "name", "details", "created", "last_request_datetime"]
     readonly_fields = fields
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["revoke_devices"]
+
+    def get_list_display(self, request):
+        # the user link keeps the filters, the search and the ordering of the current changelist
+        def user_link(obj):
+            return self.user_link(obj, request.GET)
+        user_link.short_description = self.user_link.short_description
+        user_link.admin_order_field = self.user_link.admin_order_field
+
+        list_display = super(DeviceAdmin, self).get_list_display(request)
+        return [user_link if name == "user_link" else name for name in list_display]
+
+    def user_link(self, obj, params=None):
+        # filtering by the id of the user instead of listing all users in the sidebar
+        query = params.copy() if params is not None else QueryDict(mutable=True)
+        query.pop(PAGE_VAR, None)
+        query["user__id__exact"] = obj.user_id
+        return format_html('<a href="?{}">{}</a>', query.urlencode(), obj.user)
+    user_link.short_description = "user"
+    user_link.admin_order_field = "user"
+
+    def revoke_devices(self, request, queryset):
+        if not self.has_delete_permission(request):
+            raise PermissionDenied
+        deleted = delete_devices(queryset)
+        self.message_user(request, "Revoked {} device(s).".format(deleted))
+    revoke_devices.short_description = "Revoke selected devices"
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related("user")
+    def get_actions(self, request):
+        actions = super(DeviceAdmin, self).get_actions(request)
+        # deleting through the confirmation page collects the related objects of every selected device
+        actions.pop("delete_selected", None)
+        if not self.has_delete_permission(request):
+            actions.pop("revoke_devices", None)
+        return actions
 
     def has_add_permission(self, request):
         return False
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class JWTDevicesConfig(AppConfig):
+    name = "jwt_devices"
+    verbose_name = "JWT Devices"
+
+    def ready(self):
+        from jwt_devices import signals  # NOQA
@@ -1,13 +1,33 @@
+from contextlib import contextmanager
+
 import jwt
 from django.utils.translation import ugettext as _
 from rest_framework import exceptions
 from rest_framework_jwt.authentication import JSONWebTokenAuthentication
 from rest_framework_jwt.settings import api_settings as rfj_settings
 
-from jwt_devices.settings import api_settings
+from jwt_devices.activity import get_activity_tracker, track_activity
+from jwt_devices.compat import to_async
+from jwt_devices.metrics import timed
+from jwt_devices.settings import get_compiled_settings
+from jwt_devices.users import TokenUser
 
 jwt_decode_handler = rfj_settings.JWT_DECODE_HANDLER
-jwt_devices_decode_handler = api_settings.JWT_DEVICES_DECODE_HANDLER
+jwt_get_username_from_payload = rfj_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER
+
+
+@contextmanager
+def _decode_errors():
+    try:
+        yield
+    except jwt.ExpiredSignature:
+        msg = _("Signature has expired.")
+        raise exceptions.AuthenticationFailed(msg)
+    except jwt.DecodeError:
+        msg = _("Error decoding signature.")
+        raise exceptions.AuthenticationFailed(msg)
+    except jwt.InvalidTokenError:
+        raise exceptions.AuthenticationFailed()
 
 
 class PermanentTokenAuthentication(JSONWebTokenAuthentication):
@@ -16,20 +36,64 @@ class PermanentTokenAuthentication(JSONWebTokenAuthentication):
         if jwt_value is None:
             return None
 
-        try:
-            if api_settings.JWT_PERMANENT_TOKEN_AUTH:
-                payload = jwt_devices_decode_handler(jwt_value)
+        config = get_compiled_settings()
+        with _decode_errors(), timed("decode"):
+            if config.permanent_token_auth:
+                payload = config.decode_handler(jwt_value)
             else:
                 payload = jwt_decode_handler(jwt_value)
-        except jwt.ExpiredSignature:
-            msg = _("Signature has expired.")
+
+        with timed("user_load"):
+            user = self.authenticate_credentials(payload)
+        if "device_id" in payload:
+            track_activity(payload["device_id"])
+
+        return user, jwt_value
+
+    async def aauthenticate(self, request):
+        """
+        Async variant of `authenticate()` used by the async views. The device secret is looked up by the async decode
+        handler and the user is loaded by `aauthenticate_credentials()`.
+        """
+        jwt_value = self.get_jwt_value(request)
+        if jwt_value is None:
+            return None
+
+        config = get_compiled_settings()
+        with _decode_errors(), timed("decode"):
+            if config.permanent_token_auth:
+                payload = await config.adecode_handler(jwt_value)
+            else:
+                payload = jwt_decode_handler(jwt_value)
+
+        with timed("user_load"):
+            user = await self.aauthenticate_credentials(payload)
+        if "device_id" in payload and get_activity_tracker() is not None:
+            await to_async(track_activity)(payload["device_id"])
+
+        return user, jwt_value
+
+    async def aauthenticate_credentials(self, payload):
+        return await to_async(self.authenticate_credentials)(payload)
+
+
+class StatelessPermanentTokenAuthentication(PermanentTokenAuthentication):
+    """
+    Authentication returning a `TokenUser` built from the signed claims of the token instead of loading the user
+    from the database. The user is only loaded when an attribute other than the claims is accessed.
+    """
+    def authenticate_credentials(self, payload):
+        username = jwt_get_username_from_payload(payload)
+        if not username or payload.get("user_id") is None:
+            msg = _("Invalid payload.")
             raise exceptions.AuthenticationFailed(msg)
-        except jwt.DecodeError:
-            msg = _("Error decoding signature.")
+
+        if not payload.get("is_active", True):
+            msg = _("User account is disabled.")
             raise exceptions.AuthenticationFailed(msg)
-        except jwt.InvalidTokenError:
-            raise exceptions.AuthenticationFailed()
 
-        user = self.authenticate_credentials(payload)
+        return TokenUser(payload, username=username)
 
-        return user, jwt_value
+    async def aauthenticate_credentials(self, payload):
+        # the claims are enough, no thread is needed
+        return self.authenticate_credentials(payload)
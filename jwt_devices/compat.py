@@ -0,0 +1,65 @@
+import django
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:  # Django < 3.0
+    sync_to_async = None
+
+try:
+    from asgiref.sync import markcoroutinefunction
+except ImportError:  # asgiref < 3.6
+    markcoroutinefunction = None
+
+# transaction.on_commit()
+HAS_ON_COMMIT = django.VERSION >= (1, 9)
+
+# QuerySet.aget(), aupdate(), adelete() and friends
+HAS_ASYNC_ORM = django.VERSION >= (4, 1)
+
+
+def to_async(func):
+    """
+    Returns a coroutine function running `func` in a thread, or in the event loop when asgiref is not installed.
+    """
+    if sync_to_async is not None:
+        return sync_to_async(func)
+
+    async def wrapper(*args, **kwargs):
+        return func(*args, **kwargs)
+    return wrapper
+
+
+async def aquery(queryset, method, *args, **kwargs):
+    """
+    Runs `queryset.<method>()` with its async ORM variant (e.g. `aget()` for "get") when Django has one.
+    """
+    if HAS_ASYNC_ORM:
+        return await getattr(queryset, "a" + method)(*args, **kwargs)
+    return await to_async(getattr(queryset, method))(*args, **kwargs)
+
+
+async def acache(cache, method, *args, **kwargs):
+    """
+    Runs `cache.<method>()` with the async variant of the cache backend (Django 4.0+) when it has one.
+    """
+    async_method = getattr(cache, "a" + method, None)
+    if async_method is not None:
+        return await async_method(*args, **kwargs)
+    return await to_async(getattr(cache, method))(*args, **kwargs)
+
+
+def iscoroutinefunction(func):
+    # asyncio takes a while to import and is not needed by the sync deployments
+    import asyncio
+    return asyncio.iscoroutinefunction(func)
+
+
+def mark_coroutine(obj):
+    """
+    Marks a callable object, e.g. a middleware instance, to be awaited by Django's async handler.
+    """
+    if markcoroutinefunction is not None:
+        markcoroutinefunction(obj)
+    else:
+        import asyncio
+        obj._is_coroutine = getattr(asyncio.coroutines, "_is_coroutine", None)
@@ -0,0 +1,59 @@
+# Conversion of the public keys to and from the JSON Web Key format (RFC 7517). The module does not import Django, so
+# the verifier can be used by services without it. Requires the cryptography package.
+import base64
+
+EC_CURVES = {
+    "secp256r1": ("P-256", 32),
+    "secp384r1": ("P-384", 48),
+    "secp521r1": ("P-521", 66),
+}
+
+
+def _b64encode_int(value, length=None):
+    length = length or max(1, (value.bit_length() + 7) // 8)
+    return base64.urlsafe_b64encode(value.to_bytes(length, "big")).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value.encode("ascii") + b"=" * (-len(value) % 4))
+
+
+def _b64decode_int(value):
+    return int.from_bytes(_b64decode(value), "big")
+
+
+def public_key_to_jwk(public_key, kid, algorithm):
+    """
+    Returns the JWK dict of an RSA or EC public key.
+    """
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    jwk = {"kid": kid, "alg": algorithm, "use": "sig"}
+    if isinstance(public_key, rsa.RSAPublicKey):
+        numbers = public_key.public_numbers()
+        jwk.update(kty="RSA", n=_b64encode_int(numbers.n), e=_b64encode_int(numbers.e))
+    else:
+        numbers = public_key.public_numbers()
+        crv, length = EC_CURVES[public_key.curve.name]
+        jwk.update(kty="EC", crv=crv, x=_b64encode_int(numbers.x, length), y=_b64encode_int(numbers.y, length))
+    return jwk
+
+
+def jwk_to_public_key(jwk):
+    """
+    Returns the public key of a JWK dict, raises ValueError for unsupported keys.
+    """
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    try:
+        if jwk["kty"] == "RSA":
+            numbers = rsa.RSAPublicNumbers(_b64decode_int(jwk["e"]), _b64decode_int(jwk["n"]))
+            return numbers.public_key(default_backend())
+        if jwk["kty"] == "EC":
+            curve = {"P-256": ec.SECP256R1, "P-384": ec.SECP384R1, "P-521": ec.SECP521R1}[jwk["crv"]]
+            numbers = ec.EllipticCurvePublicNumbers(_b64decode_int(jwk["x"]), _b64decode_int(jwk["y"]), curve())
+            return numbers.public_key(default_backend())
+    except KeyError as e:
+        raise ValueError("Invalid JWK: {!r}".format(e))
+    raise ValueError("Unsupported JWK key type: {}".format(jwk.get("kty")))
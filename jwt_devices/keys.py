@@ -0,0 +1,91 @@
+import hashlib
+from collections import namedtuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.encoding import force_bytes
+
+from jwt_devices.jwk import public_key_to_jwk
+
+ASYMMETRIC_ALGORITHMS = (
+    "RS256", "RS384", "RS512", "PS256", "PS384", "PS512", "ES256", "ES384", "ES512",
+)
+
+# `public_keys` maps the key ids to the public keys accepted when verifying, including the signing one
+KeyRing = namedtuple("KeyRing", ["algorithm", "signing_key_id", "signing_key", "public_keys"])
+
+
+def load_private_key(pem):
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+    return load_pem_private_key(force_bytes(pem), password=None, backend=default_backend())
+
+
+def load_public_key(pem):
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+
+    return load_pem_public_key(force_bytes(pem), backend=default_backend())
+
+
+def get_public_key_pem(public_key):
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+    return public_key.public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo).decode("ascii")
+
+
+def get_key_id(public_key):
+    """
+    Returns a key id derived from the SHA-256 digest of the DER encoded public key.
+    """
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+    der = public_key.public_bytes(Encoding.DER, PublicFormat.SubjectPublicKeyInfo)
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+def generate_private_key(algorithm, key_size=2048):
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if algorithm.startswith(("RS", "PS")):
+        return rsa.generate_private_key(public_exponent=65537, key_size=key_size, backend=default_backend())
+    curve = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}[algorithm]
+    return ec.generate_private_key(curve(), backend=default_backend())
+
+
+def get_private_key_pem(private_key):
+    from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat
+
+    return private_key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()).decode("ascii")
+
+
+def build_keyring(algorithm, private_key, key_id=None, public_keys=None):
+    """
+    Builds the KeyRing from the PEM encoded private key and the {key id: PEM encoded public key} mapping of the
+    previous keys still accepted when verifying tokens.
+    """
+    import jwt.algorithms
+
+    if algorithm not in ASYMMETRIC_ALGORITHMS:
+        raise ImproperlyConfigured("JWT_DEVICES_ALGORITHM must be one of {}.".format(", ".join(ASYMMETRIC_ALGORITHMS)))
+    if algorithm not in jwt.algorithms.get_default_algorithms():
+        raise ImproperlyConfigured(
+            "The {} algorithm is not supported by the installed PyJWT, install the cryptography package."
+            .format(algorithm))
+    if not private_key:
+        raise ImproperlyConfigured("JWT_DEVICES_PRIVATE_KEY is required with JWT_DEVICES_ALGORITHM.")
+
+    signing_key = load_private_key(private_key)
+    signing_key_id = key_id or get_key_id(signing_key.public_key())
+    keys = {kid: load_public_key(pem) for kid, pem in (public_keys or {}).items()}
+    keys[signing_key_id] = signing_key.public_key()
+    return KeyRing(algorithm, signing_key_id, signing_key, keys)
+
+
+def get_jwks(keyring):
+    """
+    Returns the JSON Web Key Set of the public keys of the KeyRing, the signing key first.
+    """
+    kids = [keyring.signing_key_id] + sorted(kid for kid in keyring.public_keys if kid != keyring.signing_key_id)
+    return {"keys": [public_key_to_jwk(keyring.public_keys[kid], kid, keyring.algorithm) for kid in kids]}
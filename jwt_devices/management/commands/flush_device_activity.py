@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from jwt_devices.activity import get_activity_tracker
+
+
+class Command(BaseCommand):
+    help = ("Writes the device activity buffered by JWT_DEVICES_ACTIVITY_TRACKER to Device.last_request_datetime. "
+            "Only the activity shared through jwt_devices.activity.CacheActivityTracker is visible to this command.")
+
+    def handle(self, *args, **options):
+        tracker = get_activity_tracker()
+        if tracker is None:
+            raise CommandError("Device activity tracking is disabled, set JWT_DEVICES_ACTIVITY_TRACKER to enable it.")
+
+        updated = tracker.flush()
+        self.stdout.write("Updated {} devices.".format(updated))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from jwt_devices.keys import ASYMMETRIC_ALGORITHMS, generate_private_key, get_key_id, get_private_key_pem
+
+
+class Command(BaseCommand):
+    help = ("Generates a private key for JWT_DEVICES_PRIVATE_KEY and prints it with its key id. "
+            "Requires the cryptography package.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--algorithm", default="ES256", choices=ASYMMETRIC_ALGORITHMS,
+            help="The JWT_DEVICES_ALGORITHM the key is generated for (default: ES256).")
+        parser.add_argument(
+            "--key-size", type=int, default=2048, help="Size of the RSA keys in bits (default: 2048).")
+
+    def handle(self, *args, **options):
+        try:
+            private_key = generate_private_key(options["algorithm"], key_size=options["key_size"])
+        except ImportError:
+            raise CommandError("The cryptography package is required to generate the keys.")
+
+        self.stdout.write("# key id: {}".format(get_key_id(private_key.public_key())))
+        self.stdout.write(get_private_key_pem(private_key), ending="")
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jwt_devices.models import Device
+from jwt_devices.settings import api_settings
+from jwt_devices.utils import delete_devices
+
+
+class Command(BaseCommand):
+    help = ("Deletes devices whose permanent token has expired, i.e. devices not used for "
+            "JWT_PERMANENT_TOKEN_EXPIRATION_DELTA. The devices are deleted in chunks ordered by the primary key, "
+            "so no long-running lock is held on the table.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=1000, help="Number of devices deleted in one query (default: 1000).")
+        parser.add_argument(
+            "--sleep", type=float, default=0, help="Seconds to sleep between chunks to throttle the load (default: 0).")
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only count the expired devices without deleting them.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - api_settings.JWT_PERMANENT_TOKEN_EXPIRATION_DELTA
+        expired = Device.objects.filter(last_request_datetime__lt=cutoff)
+
+        if options["dry_run"]:
+            self.stdout.write("{} expired devices would be deleted.".format(expired.count()))
+            return
+
+        deleted = 0
+        last_pk = None
+        while True:
+            chunk = expired.order_by("pk")
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            pks = list(chunk.values_list("pk", flat=True)[:options["chunk_size"]])
+            if not pks:
+                break
+
+            # the expiration is checked again, in case the device was refreshed in the meantime
+            deleted += delete_devices(expired.filter(pk__in=pks))
+            last_pk = pks[-1]
+            if options["verbosity"] > 1:
+                self.stdout.write("Deleted {} expired devices so far.".format(deleted))
+
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write("Deleted {} expired devices.".format(deleted))
@@ -0,0 +1,114 @@
+import logging
+import time
+
+from django.db import connection
+
+from jwt_devices.settings import LazyInstance
+
+
+class BaseMetricsBackend(object):
+    """
+    Receives the duration and the number of queries of the instrumented steps: "secret_lookup", "decode",
+    "user_load", "refresh" and "device_creation". Set `count_queries` to False to skip counting the queries.
+    """
+    count_queries = True
+
+    def record(self, name, duration, queries=None):
+        """
+        Records one step taking `duration` seconds. `queries` is None if the queries were not counted, e.g. in async
+        code running the queries in another thread.
+        """
+        raise NotImplementedError
+
+
+class LoggingMetricsBackend(BaseMetricsBackend):
+    """
+    Writes every measurement to the "jwt_devices.metrics" logger, with the values in the `metric`, `duration` and
+    `queries` attributes of the log record.
+    """
+    logger = logging.getLogger("jwt_devices.metrics")
+    level = logging.INFO
+
+    def record(self, name, duration, queries=None):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(
+                self.level, "%s took %.3f ms, %s queries", name, duration * 1000, queries,
+                extra={"metric": name, "duration": duration, "queries": queries})
+
+
+class _QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class _Timer(object):
+    __slots__ = ("backend", "name", "start", "counter", "wrapper", "force_debug_cursor", "initial_queries")
+
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.name = name
+        self.counter = self.wrapper = self.force_debug_cursor = self.initial_queries = None
+
+    def __enter__(self):
+        if self.backend.count_queries:
+            # Connection.execute_wrapper() was added in Django 2.0, the older versions count the queries logged by
+            # the debug cursor, forced within the block
+            if hasattr(connection, "execute_wrapper"):
+                self.counter = _QueryCounter()
+                self.wrapper = connection.execute_wrapper(self.counter)
+                self.wrapper.__enter__()
+            else:
+                self.force_debug_cursor = connection.force_debug_cursor
+                connection.force_debug_cursor = True
+                self.initial_queries = len(connection.queries_log)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.start
+        queries = None
+        if self.wrapper is not None:
+            self.wrapper.__exit__(exc_type, exc_value, traceback)
+            queries = self.counter.count
+        elif self.initial_queries is not None:
+            final_queries = len(connection.queries_log)
+            connection.force_debug_cursor = self.force_debug_cursor
+            # the queries can't be counted once the log is full
+            if final_queries < connection.queries_limit:
+                queries = final_queries - self.initial_queries
+        self.backend.record(self.name, duration, queries)
+
+
+class _NoopTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_noop_timer = _NoopTimer()
+_metrics_backend = LazyInstance("metrics_backend")
+
+
+def get_metrics_backend():
+    """
+    Returns the `JWT_DEVICES_METRICS_BACKEND` instance, or None if metrics are disabled.
+    """
+    return _metrics_backend.get()
+
+
+def timed(name):
+    """
+    Context manager measuring the block as the `name` step, a shared no-op when metrics are disabled.
+    """
+    backend = get_metrics_backend()
+    if backend is None:
+        return _noop_timer
+    return _Timer(backend, name)
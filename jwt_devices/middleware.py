@@ -1,29 +1,94 @@
 from django.http.response import JsonResponse
+from django.urls import Resolver404, resolve
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import status
 
-from jwt_devices import views
-from jwt_devices.settings import api_settings
+from jwt_devices.compat import iscoroutinefunction, mark_coroutine
+from jwt_devices.settings import get_compiled_settings, get_permanent_token_views
 
 
-class PermittedHeadersMiddleware(object):
+class BasePermittedHeadersMiddleware(object):
+    """
+    Base of the middlewares disallowing the Permanent-Token header for the views other than
+    `JWT_DEVICES_PERMANENT_TOKEN_VIEWS`, resolved to the view classes once.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            mark_coroutine(self)
+
+    def check_view(self, view_func):
+        """
+        Returns the error response if the Permanent-Token header is not allowed for the view, None otherwise.
+        """
+        view_cls = getattr(view_func, "cls", None)
+        if view_cls is None or not get_compiled_settings().permanent_token_auth:
+            return None
+        if view_cls in get_permanent_token_views():
+            return None
+
+        return JsonResponse({
+            "HTTP_PERMANENT_TOKEN": {
+                "details": _("Using the Permanent-Token header is disallowed for {}").format(type(view_cls))
+            }
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PermittedHeadersMiddleware(BasePermittedHeadersMiddleware):
     """
     Middleware used to disallow sending the permanent_token header in other requests than during permanent token
     refresh to make sure naive FE developers do not send the fragile permanent token with each request.
+    The middleware runs in both sync and async (ASGI) middleware chains.
     """
 
     def __init__(self, get_response=None):
-        self.get_response = get_response
+        super(PermittedHeadersMiddleware, self).__init__(get_response)
+        if self.is_async:
+            # Django runs a synchronous process_view() of an async middleware in a thread
+            self.process_view = self.aprocess_view
 
     def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
         if self.get_response:
             return self.get_response(request)
 
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return type(self).process_view(self, request, view_func, view_args, view_kwargs)
+
     def process_view(self, request, view_func, view_args, view_kwargs):
-        view_cls = getattr(view_func, "cls", None)
-        if (view_cls and api_settings.JWT_PERMANENT_TOKEN_AUTH and request.META.get("HTTP_PERMANENT_TOKEN") and view_cls != views.DeviceRefreshJSONWebToken):
-            return JsonResponse({
-                "HTTP_PERMANENT_TOKEN": {
-                    "details": _("Using the Permanent-Token header is disallowed for {}").format(type(view_cls))
-                }
-            }, status=status.HTTP_400_BAD_REQUEST)
+        if not request.META.get("HTTP_PERMANENT_TOKEN"):
+            return None
+        return self.check_view(view_func)
+
+
+class PermittedHeadersCallMiddleware(BasePermittedHeadersMiddleware):
+    """
+    Variant of `PermittedHeadersMiddleware` without the `process_view()` hook. The view is resolved from the path of
+    the request, only when the Permanent-Token header is present.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.check_request(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.check_request(request) or await self.get_response(request)
+
+    def check_request(self, request):
+        if not request.META.get("HTTP_PERMANENT_TOKEN"):
+            return None
+
+        try:
+            match = resolve(request.path_info, getattr(request, "urlconf", None))
+        except Resolver404:
+            return None
+        return self.check_view(match.func)
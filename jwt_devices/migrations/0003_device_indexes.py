@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jwt_devices', '0002_auto_20181010_2152'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='device',
+            name='last_request_datetime',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='device',
+            index_together=set([('user', 'last_request_datetime')]),
+        ),
+    ]
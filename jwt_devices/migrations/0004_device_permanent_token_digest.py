@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 08:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jwt_devices', '0003_device_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='permanent_token_digest',
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='device',
+            name='permanent_token',
+            field=models.CharField(max_length=255, null=True),
+        ),
+    ]
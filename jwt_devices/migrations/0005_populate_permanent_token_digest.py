@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+BATCH_SIZE = 250
+
+
+def populate_permanent_token_digest(apps, schema_editor):
+    Device = apps.get_model("jwt_devices", "Device")
+    devices = Device.objects.using(schema_editor.connection.alias).filter(
+        permanent_token_digest__isnull=True, permanent_token__isnull=False)
+    last_pk = 0
+    while True:
+        batch = list(devices.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "permanent_token")[:BATCH_SIZE])
+        if not batch:
+            break
+
+        devices.filter(pk__in=[pk for pk, _ in batch]).update(permanent_token_digest=Case(
+            *[When(pk=pk, then=Value(hashlib.sha256(token.encode("utf-8")).hexdigest())) for pk, token in batch],
+            output_field=models.CharField()
+        ))
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+    # every batch is committed separately, so a large table is not locked for the whole migration
+    atomic = False
+
+    dependencies = [
+        ('jwt_devices', '0004_device_permanent_token_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_permanent_token_digest, migrations.RunPython.noop),
+    ]
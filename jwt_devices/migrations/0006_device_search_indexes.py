@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# the admin search (`istartswith`) compares UPPER(column) with LIKE 'PREFIX%', which a plain btree index can't serve
+# on PostgreSQL with a non-C collation
+SEARCH_INDEXES = [
+    ("jwt_devices_device_name_upper_like", "name"),
+    ("jwt_devices_device_details_upper_like", "details"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for name, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS "{}" ON "jwt_devices_device" (UPPER("{}") text_pattern_ops)'.format(
+                name, column))
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute('DROP INDEX IF EXISTS "{}"'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jwt_devices', '0005_populate_permanent_token_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
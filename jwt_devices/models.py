@@ -1,4 +1,5 @@
 import binascii
+import hashlib
 import os
 import uuid
 
@@ -6,24 +7,50 @@ from django.conf import settings
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
+from jwt_devices.settings import get_compiled_settings
+
 
 class Device(models.Model):
     """
     Device model used for permanent token authentication
+    Permanent tokens are looked up by their SHA-256 digest, with `JWT_DEVICES_HASH_PERMANENT_TOKENS` enabled
+    the plaintext token is not stored at all.
     """
-    permanent_token = models.CharField(max_length=255, unique=True)
+    permanent_token = models.CharField(max_length=255, null=True)
+    permanent_token_digest = models.CharField(max_length=64, unique=True, null=True)
     jwt_secret = models.UUIDField(default=uuid.uuid4, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     name = models.CharField(_("Device name"), max_length=255)
     details = models.CharField(_("Device details"), max_length=255, blank=True)
-    last_request_datetime = models.DateTimeField(auto_now=True)
+    # indexed for finding expired devices
+    last_request_datetime = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # listing devices of a user, most recently used first (the index is scanned backwards)
+        index_together = [("user", "last_request_datetime")]
 
     def save(self, *args, **kwargs):
-        if not self.permanent_token:
+        if not self.permanent_token and not self.permanent_token_digest:
             self.permanent_token = self.generate_key()
 
-        return super(Device, self).save(*args, **kwargs)
+        if not self.permanent_token:
+            return super(Device, self).save(*args, **kwargs)
+
+        self.permanent_token_digest = self.hash_token(self.permanent_token)
+        if not get_compiled_settings().hash_permanent_tokens:
+            return super(Device, self).save(*args, **kwargs)
+
+        # the plaintext token stays on the instance only, so it can be returned after login
+        permanent_token, self.permanent_token = self.permanent_token, None
+        try:
+            return super(Device, self).save(*args, **kwargs)
+        finally:
+            self.permanent_token = permanent_token
 
     def generate_key(self):
         return binascii.hexlify(os.urandom(20)).decode()
+
+    @staticmethod
+    def hash_token(permanent_token):
+        return hashlib.sha256(permanent_token.encode("utf-8")).hexdigest()
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DeviceCursorPagination(CursorPagination):
+    """
+    Cursor pagination of the devices of the user, most recently used devices first.
+    Devices used at the same time are ordered by their ID.
+    """
+    ordering = ("-last_request_datetime", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
@@ -0,0 +1,248 @@
+import hashlib
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from rest_framework_jwt.settings import api_settings as rfj_settings
+
+from jwt_devices.compat import acache, to_async
+from jwt_devices.settings import LazyInstance, api_settings
+
+FETCH_BATCH_SIZE = 1000
+
+
+class BloomFilter(object):
+    """
+    Set membership test without false negatives, sized for `capacity` values with the false positive probability of
+    `error_rate`. Values can't be removed, the filter is rebuilt instead.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # double hashing, the k positions are derived from two 64-bit halves of one digest (blake2b needs Python 3.6)
+        digest = hashlib.sha256(value.encode("utf-8")).digest()[:16]
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class CacheRevocationList(object):
+    """
+    Denylist of the revoked devices and token ids (the `jti` claim) shared by all processes through the
+    `JWT_DEVICES_REVOCATION_CACHE` Django cache, kept as long as the tokens issued before the revocation are valid.
+
+    Every process keeps a bloom filter of the revoked ids, updated with the revocations recorded since the previous
+    sync once per `JWT_DEVICES_REVOCATION_SYNC_INTERVAL`, so tokens which are not revoked are checked in memory and
+    only the ids matching the filter are confirmed in the cache. The filter is rebuilt from the unexpired revocations
+    once the revocations it holds have expired.
+    """
+    key_prefix = "jwt_devices:revocation:"
+
+    def __init__(self):
+        self.cache_alias = api_settings.JWT_DEVICES_REVOCATION_CACHE
+        self.sync_interval = api_settings.JWT_DEVICES_REVOCATION_SYNC_INTERVAL.total_seconds()
+        self.capacity = api_settings.JWT_DEVICES_REVOCATION_CAPACITY
+        self.error_rate = api_settings.JWT_DEVICES_REVOCATION_ERROR_RATE
+        # the longest time a token issued before the revocation is accepted
+        lifetime = rfj_settings.JWT_EXPIRATION_DELTA.total_seconds() + rfj_settings.JWT_LEEWAY
+        self.timeout = max(1, int(math.ceil(lifetime)))
+
+        self._bloom = BloomFilter(self.capacity, self.error_rate)
+        self._epoch = None
+        self._synced = 0
+        self._retry = []
+        self._next_sync = 0
+        self._next_rebuild = 0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    @property
+    def shared_cache(self):
+        return caches[self.cache_alias]
+
+    def get_cache_key(self, *parts):
+        return self.key_prefix + ":".join(str(part) for part in parts)
+
+    def revoke(self, values):
+        """
+        Records the revocation of the ids, e.g. "device:<id>" or "jti:<jti>", visible to all processes after their
+        next sync and to the current process immediately.
+        """
+        values = list(values)
+        if not values:
+            return
+
+        cache = self.shared_cache
+        cache.set_many({self.get_cache_key("revoked", value): True for value in values}, timeout=self.timeout)
+        sequence_key = self.get_cache_key("sequence")
+        if cache.add(sequence_key, 0, timeout=None):
+            # tells the processes the sequence was started again, e.g. after the cache was cleared
+            cache.set(self.get_cache_key("epoch"), uuid.uuid4().hex, timeout=None)
+        # the first sequence number of each period bounds the revocations read when rebuilding the filter, it is
+        # read before incrementing the sequence so it is never above the number of any revocation of the period
+        cache.add(
+            self.get_cache_key("floor", int(time.time() // self.timeout)), (cache.get(sequence_key) or 0) + 1,
+            timeout=self.timeout * 3)
+        last = cache.incr(sequence_key, len(values))
+        first = last - len(values) + 1
+        cache.set_many(
+            {self.get_cache_key("event", first + i): value for i, value in enumerate(values)}, timeout=self.timeout)
+
+        with self._lock:
+            for value in values:
+                self._bloom.add(value)
+
+    def _fetch(self, bloom, sequences):
+        """
+        Adds the revocations with the sequence numbers to the filter, returns the numbers not found in the cache.
+        """
+        cache = self.shared_cache
+        missing = []
+        for start in range(0, len(sequences), FETCH_BATCH_SIZE):
+            keys = {self.get_cache_key("event", sequence): sequence
+                    for sequence in sequences[start:start + FETCH_BATCH_SIZE]}
+            events = cache.get_many(list(keys))
+            with self._lock:
+                for value in events.values():
+                    bloom.add(value)
+            missing.extend(sequence for key, sequence in keys.items() if key not in events)
+        return missing
+
+    def sync(self):
+        """
+        Adds the revocations recorded by the other processes since the previous sync to the filter, or rebuilds it.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            # another thread is syncing right now
+            return
+
+        try:
+            now = time.monotonic()
+            self._next_sync = now + self.sync_interval
+            cache = self.shared_cache
+            sequence_key, epoch_key = self.get_cache_key("sequence"), self.get_cache_key("epoch")
+            values = cache.get_many([sequence_key, epoch_key])
+            last = values.get(sequence_key) or 0
+            epoch = values.get(epoch_key)
+
+            bloom = self._bloom
+            if now >= self._next_rebuild or epoch != self._epoch or bloom.count > bloom.capacity:
+                period = int(time.time() // self.timeout)
+                floors = cache.get_many([self.get_cache_key("floor", period - 1), self.get_cache_key("floor", period)])
+                first = min(floors.values()) if floors else last + 1
+                bloom = BloomFilter(max(self.capacity, 2 * (last - first + 1)), self.error_rate)
+                retry = []
+                self._next_rebuild = now + self.timeout
+            else:
+                first = self._synced + 1
+                # a revocation may have taken its sequence number without storing its id yet, so the missing ids
+                # are fetched once more on the next sync
+                retry = self._retry
+
+            missing = self._fetch(bloom, retry + list(range(first, last + 1)))
+            self._retry = [sequence for sequence in missing if sequence not in retry]
+            self._epoch = epoch
+            self._synced = last
+            self._bloom = bloom
+        finally:
+            self._sync_lock.release()
+
+    def _get_candidates(self, device_id=None, jti=None):
+        values = []
+        if device_id is not None:
+            values.append("device:{}".format(device_id))
+        if jti is not None:
+            values.append("jti:{}".format(jti))
+        return [self.get_cache_key("revoked", value) for value in values if value in self._bloom]
+
+    def is_revoked(self, device_id=None, jti=None):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+
+        candidates = self._get_candidates(device_id, jti)
+        return bool(candidates) and bool(self.shared_cache.get_many(candidates))
+
+    async def ais_revoked(self, device_id=None, jti=None):
+        """
+        Async variant of `is_revoked()`, the filter is synced in a thread.
+        """
+        if time.monotonic() >= self._next_sync:
+            await to_async(self.sync)()
+
+        candidates = self._get_candidates(device_id, jti)
+        return bool(candidates) and bool(await acache(self.shared_cache, "get_many", candidates))
+
+
+_revocation_list = LazyInstance("revocation_list")
+
+
+def get_revocation_list():
+    """
+    Returns the `JWT_DEVICES_REVOCATION_LIST` instance, or None if tokens are only rejected once their device is gone.
+    """
+    return _revocation_list.get()
+
+
+_revocation = threading.local()
+
+
+def revoke_devices(device_ids):
+    """
+    Revokes the tokens of the devices, or defers it to the end of `bulk_revocation()`.
+    """
+    revoke(["device:{}".format(device_id) for device_id in device_ids])
+
+
+def revoke_tokens(jtis):
+    """
+    Revokes the tokens with the `jti` claims.
+    """
+    revoke(["jti:{}".format(jti) for jti in jtis])
+
+
+def revoke(values):
+    if get_revocation_list() is None:
+        return
+
+    pending = getattr(_revocation, "pending", None)
+    if pending is not None:
+        pending.update(values)
+    else:
+        get_revocation_list().revoke(values)
+
+
+@contextmanager
+def bulk_revocation():
+    """
+    Collects the ids revoked within the block, e.g. by deleting many devices, and records them with one `revoke()`
+    call at the end of the block.
+    """
+    if getattr(_revocation, "pending", None) is not None:
+        yield
+        return
+
+    _revocation.pending = set()
+    try:
+        yield
+    finally:
+        pending, _revocation.pending = _revocation.pending, None
+        if pending:
+            get_revocation_list().revoke(sorted(pending))
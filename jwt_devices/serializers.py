@@ -1,4 +1,5 @@
 from django.contrib.auth import authenticate, get_user_model
+from django.db import transaction
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 from rest_framework import serializers
@@ -6,16 +7,23 @@ from rest_framework_jwt.compat import Serializer
 from rest_framework_jwt.serializers import JSONWebTokenSerializer as OriginalJSONWebTokenSerializer
 from rest_framework_jwt.settings import api_settings as rfj_settings
 
+from jwt_devices.compat import aquery
+from jwt_devices.metrics import timed
 from jwt_devices.models import Device
-from jwt_devices.settings import api_settings
-from jwt_devices.utils import get_device_details
+from jwt_devices.settings import get_compiled_settings
+from jwt_devices.utils import evict_devices, get_device_details, get_reusable_device, rotate_device_credentials
 
 User = get_user_model()
 
 jwt_payload_handler = rfj_settings.JWT_PAYLOAD_HANDLER
 jwt_encode_handler = rfj_settings.JWT_ENCODE_HANDLER
-jwt_devices_payload_handler = api_settings.JWT_DEVICES_PAYLOAD_HANDLER
-jwt_devices_encode_handler = api_settings.JWT_DEVICES_ENCODE_HANDLER
+
+
+def encode_device_token(payload, device):
+    config = get_compiled_settings()
+    if config.encode_handler_accepts_device:
+        return config.encode_handler(payload, device=device)
+    return config.encode_handler(payload)
 
 
 class JSONWebTokenSerializer(OriginalJSONWebTokenSerializer):
@@ -39,13 +47,24 @@ class JSONWebTokenSerializer(OriginalJSONWebTokenSerializer):
                 data = {
                     "user": user
                 }
-                if api_settings.JWT_PERMANENT_TOKEN_AUTH:
-                    device_name, device_details = get_device_details(self.context["request"].META)
-                    device = Device.objects.create(
-                        user=user, last_request_datetime=timezone.now(),
-                        name=device_name, details=device_details)
-
-                    data["token"] = jwt_devices_encode_handler(jwt_devices_payload_handler(user, device=device))
+                config = get_compiled_settings()
+                if config.permanent_token_auth:
+                    headers = self.context["request"].META
+                    device_name, device_details = get_device_details(headers)
+                    with timed("device_creation"), transaction.atomic():
+                        device = None
+                        if config.reuse_devices:
+                            device = get_reusable_device(user, headers, device_name, device_details)
+
+                        if device:
+                            rotate_device_credentials(device, name=device_name, details=device_details)
+                        else:
+                            device = Device.objects.create(
+                                user=user, last_request_datetime=timezone.now(),
+                                name=device_name, details=device_details)
+                            evict_devices(user)
+
+                    data["token"] = encode_device_token(config.payload_handler(user, device=device), device)
                     data["device"] = device
                 else:
                     data["token"] = jwt_encode_handler(jwt_payload_handler(user))
@@ -61,36 +80,123 @@ class JSONWebTokenSerializer(OriginalJSONWebTokenSerializer):
 
 
 class DeviceSerializer(serializers.ModelSerializer):
+    """
+    Serializer of the devices of the user. The `fields` query parameter, e.g. `?fields=id,name`, limits the serialized
+    fields.
+    """
     class Meta:
         model = Device
         fields = ["id", "created", "name", "details", "last_request_datetime"]
 
+    def __init__(self, *args, **kwargs):
+        super(DeviceSerializer, self).__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is not None:
+            fields = self.get_requested_fields(request)
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        """
+        Returns the fields requested with the `fields` query parameter, unknown fields are ignored.
+        """
+        requested = request.query_params.get("fields")
+        if not requested:
+            return list(cls.Meta.fields)
+
+        requested = {field_name.strip() for field_name in requested.split(",")}
+        return [field_name for field_name in cls.Meta.fields if field_name in requested] or list(cls.Meta.fields)
+
+
+class DeviceBulkLogoutSerializer(Serializer):
+    """
+    Serializer used to log out many devices at once: the devices listed in `ids`, or all devices of the user if `ids`
+    is not given. With `keep_current` set, the device of the token used in the request is kept.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    keep_current = serializers.BooleanField(default=False)
+
 
 class DeviceTokenRefreshSerializer(Serializer):
+    """
+    Serializer used to refresh JWT token using permanent token.
+    Refreshing takes one query to load the device along with its user, plus one conditional UPDATE of
+    `last_request_datetime` at most once per `JWT_PERMANENT_TOKEN_EXPIRATION_ACCURACY`.
+    """
     HTTP_PERMANENT_TOKEN = serializers.CharField(required=True)
 
+    def get_device_queryset(self, permanent_token):
+        return Device.objects.select_related("user").filter(permanent_token_digest=Device.hash_token(permanent_token))
+
+    def get_activity_update(self, device, now):
+        """
+        Returns the queryset and the values bumping `last_request_datetime` of the device, or None if it is recent.
+        """
+        config = get_compiled_settings()
+        threshold = now - config.expiration_accuracy
+        if device.last_request_datetime >= threshold:
+            return None
+
+        values = {"last_request_datetime": now}
+        if config.hash_permanent_tokens and device.permanent_token:
+            # drops the plaintext token of a device created before hashing was enabled
+            values["permanent_token"] = None
+        # the condition is repeated in the query, so only one of concurrent refreshes writes the row
+        return Device.objects.filter(pk=device.pk, last_request_datetime__lt=threshold), values
+
+    def is_expired(self, device, now):
+        return now > device.last_request_datetime + get_compiled_settings().expiration_delta
+
     def _get_device(self, attrs):
-        permanent_token = attrs["HTTP_PERMANENT_TOKEN"]
         try:
-            device = Device.objects.get(permanent_token=permanent_token)
+            device = self.get_device_queryset(attrs["HTTP_PERMANENT_TOKEN"]).get()
         except Device.DoesNotExist:
             raise serializers.ValidationError({"HTTP_PERMANENT_TOKEN": _("Invalid permanent_token value.")})
 
         now = timezone.now()
-        if now > device.last_request_datetime + api_settings.JWT_PERMANENT_TOKEN_EXPIRATION_DELTA:
+        if self.is_expired(device, now):
             device.delete()
             raise serializers.ValidationError({"HTTP_PERMANENT_TOKEN": _("Permanent token has expired.")})
 
-        if now > device.last_request_datetime + api_settings.JWT_PERMANENT_TOKEN_EXPIRATION_ACCURACY:
+        update = self.get_activity_update(device, now)
+        if update is not None:
+            queryset, values = update
+            queryset.update(**values)
             device.last_request_datetime = now
-            device.save()
 
         return device
 
-    def validate(self, attrs):
-        device = self._get_device(attrs)
-        payload = jwt_devices_payload_handler(device.user, device=device)
+    async def aget_device(self, permanent_token):
+        """
+        Async variant of `_get_device()` used by the async refresh view.
+        """
+        try:
+            device = await aquery(self.get_device_queryset(permanent_token), "get")
+        except Device.DoesNotExist:
+            raise serializers.ValidationError({"HTTP_PERMANENT_TOKEN": _("Invalid permanent_token value.")})
+
+        now = timezone.now()
+        if self.is_expired(device, now):
+            await aquery(Device.objects.filter(pk=device.pk), "delete")
+            raise serializers.ValidationError({"HTTP_PERMANENT_TOKEN": _("Permanent token has expired.")})
+
+        update = self.get_activity_update(device, now)
+        if update is not None:
+            queryset, values = update
+            await aquery(queryset, "update", **values)
+            device.last_request_datetime = now
+
+        return device
+
+    def get_token_data(self, device):
+        user = device.user
+        payload = get_compiled_settings().payload_handler(user, device=device)
         return {
-            "token": jwt_devices_encode_handler(payload),
-            "user": device.user
+            "token": encode_device_token(payload, device),
+            "user": user
         }
+
+    def validate(self, attrs):
+        with timed("refresh"):
+            return self.get_token_data(self._get_device(attrs))
@@ -1,7 +1,12 @@
 import datetime
+import threading
+import warnings
+from collections import namedtuple
 
 from django.conf import settings
-from rest_framework.settings import APISettings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from rest_framework.settings import APISettings, import_from_string
 
 USER_SETTINGS = getattr(settings, "JWT_DEVICES", None)
 
@@ -9,6 +14,39 @@ DEFAULTS = {
     "JWT_PERMANENT_TOKEN_AUTH": True,
     "JWT_PERMANENT_TOKEN_EXPIRATION_ACCURACY": datetime.timedelta(minutes=30),
     "JWT_PERMANENT_TOKEN_EXPIRATION_DELTA": datetime.timedelta(days=7),
+    "JWT_DEVICES_HASH_PERMANENT_TOKENS": False,
+    "JWT_DEVICES_REUSE_DEVICES": False,
+    "JWT_DEVICES_MAX_PER_USER": None,
+    "JWT_DEVICES_EVICTION_POLICY": "least_recently_used",
+
+    "JWT_DEVICES_KID_HEADER": False,
+    "JWT_DEVICES_ALGORITHM": None,
+    "JWT_DEVICES_PRIVATE_KEY": None,
+    "JWT_DEVICES_KEY_ID": None,
+    "JWT_DEVICES_PUBLIC_KEYS": {},
+    "JWT_DEVICES_JWKS_MAX_AGE": datetime.timedelta(hours=1),
+    "JWT_DEVICES_PAGINATION_CLASS": None,
+    "JWT_DEVICES_PERMANENT_TOKEN_VIEWS": ("jwt_devices.views.DeviceRefreshJSONWebToken",),
+
+    "JWT_DEVICES_SECRET_STORE": "jwt_devices.stores.DatabaseSecretStore",
+    "JWT_DEVICES_SECRET_STORE_CACHE": "default",
+    "JWT_DEVICES_SECRET_STORE_CACHE_TTL": datetime.timedelta(hours=1),
+    "JWT_DEVICES_SECRET_CACHE_SIZE": 1024,
+    "JWT_DEVICES_SECRET_CACHE_TTL": datetime.timedelta(seconds=60),
+    "JWT_DEVICES_SECRET_NEGATIVE_TTL": datetime.timedelta(seconds=5),
+
+    "JWT_DEVICES_ACTIVITY_TRACKER": None,
+    "JWT_DEVICES_ACTIVITY_CACHE": "default",
+    "JWT_DEVICES_ACTIVITY_FLUSH_INTERVAL": datetime.timedelta(seconds=60),
+    "JWT_DEVICES_ACTIVITY_BUFFER_SIZE": 1000,
+
+    "JWT_DEVICES_REVOCATION_LIST": None,
+    "JWT_DEVICES_REVOCATION_CACHE": "default",
+    "JWT_DEVICES_REVOCATION_SYNC_INTERVAL": datetime.timedelta(seconds=5),
+    "JWT_DEVICES_REVOCATION_CAPACITY": 10000,
+    "JWT_DEVICES_REVOCATION_ERROR_RATE": 0.001,
+
+    "JWT_DEVICES_METRICS_BACKEND": None,
 
     "JWT_DEVICES_RESPONSE_PAYLOAD_HANDLER":
     "jwt_devices.utils.jwt_devices_response_payload_handler",
@@ -24,6 +62,11 @@ DEFAULTS = {
 }
 
 IMPORT_STRINGS = (
+    "JWT_DEVICES_SECRET_STORE",
+    "JWT_DEVICES_ACTIVITY_TRACKER",
+    "JWT_DEVICES_REVOCATION_LIST",
+    "JWT_DEVICES_METRICS_BACKEND",
+    "JWT_DEVICES_PAGINATION_CLASS",
     "JWT_DEVICES_RESPONSE_PAYLOAD_HANDLER",
     "JWT_DEVICES_PAYLOAD_HANDLER",
     "JWT_DEVICES_ENCODE_HANDLER",
@@ -31,4 +74,205 @@ IMPORT_STRINGS = (
 )
 # List of settings that may be in string import notation.
 
-api_settings = APISettings(USER_SETTINGS, DEFAULTS, IMPORT_STRINGS)
+
+class JWTDevicesSettings(APISettings):
+    """
+    API settings read from the `JWT_DEVICES` Django setting. Without it, the settings are read from `REST_FRAMEWORK`
+    with a deprecation warning.
+    """
+
+    @property
+    def user_settings(self):
+        if not hasattr(self, "_user_settings"):
+            user_settings = getattr(settings, "JWT_DEVICES", None)
+            if not user_settings:
+                user_settings = {
+                    key: value for key, value in (getattr(settings, "REST_FRAMEWORK", None) or {}).items()
+                    if key in self.defaults
+                }
+                if user_settings:
+                    warnings.warn(
+                        "Reading {} from the REST_FRAMEWORK setting is deprecated, move them to the JWT_DEVICES "
+                        "setting.".format(", ".join(sorted(user_settings))), DeprecationWarning)
+            self._user_settings = user_settings
+        return self._user_settings
+
+    def reload(self):
+        for attr in list(self.defaults) + ["_user_settings"]:
+            self.__dict__.pop(attr, None)
+        getattr(self, "_cached_attrs", set()).clear()
+
+
+api_settings = JWTDevicesSettings(USER_SETTINGS, DEFAULTS, IMPORT_STRINGS)
+
+# Immutable snapshot of the settings read on the hot paths, with the handlers resolved and the durations used as
+# cache timeouts converted to seconds. The views accepting the Permanent-Token header are kept as configured, so
+# compiling the settings does not import the views, see `get_permanent_token_views()`.
+# `keyring` holds the loaded server keys of the asymmetric mode, or None when the tokens are signed with the device
+# secrets.
+CompiledSettings = namedtuple("CompiledSettings", [
+    "permanent_token_auth",
+    "hash_permanent_tokens",
+    "reuse_devices",
+    "max_devices_per_user",
+    "eviction_policy",
+    "expiration_delta",
+    "expiration_accuracy",
+    "kid_header",
+    "keyring",
+    "permanent_token_views",
+    "payload_handler",
+    "encode_handler",
+    "encode_handler_accepts_device",
+    "decode_handler",
+    "adecode_handler",
+    "response_payload_handler",
+    "secret_cache_ttl",
+    "secret_store_cache_ttl",
+    "secret_negative_ttl",
+    "activity_flush_interval",
+    "secret_store",
+    "activity_tracker",
+    "revocation_list",
+    "metrics_backend",
+    "pagination_class",
+])
+
+_compiled_settings = None
+_permanent_token_views = None
+
+
+def compile_settings():
+    from jwt_devices import utils
+    from jwt_devices.compat import to_async
+
+    decode_handler = api_settings.JWT_DEVICES_DECODE_HANDLER
+    if decode_handler is utils.jwt_devices_decode_handler:
+        adecode_handler = utils.jwt_devices_adecode_handler
+    else:
+        # a custom decode handler is run in a thread
+        adecode_handler = to_async(decode_handler)
+
+    if api_settings.JWT_DEVICES_EVICTION_POLICY not in utils.EVICTION_POLICIES:
+        raise ImproperlyConfigured("JWT_DEVICES_EVICTION_POLICY must be one of {}.".format(
+            ", ".join(sorted(utils.EVICTION_POLICIES))))
+
+    keyring = None
+    if api_settings.JWT_DEVICES_ALGORITHM:
+        from jwt_devices.keys import build_keyring
+
+        keyring = build_keyring(
+            api_settings.JWT_DEVICES_ALGORITHM,
+            api_settings.JWT_DEVICES_PRIVATE_KEY,
+            key_id=api_settings.JWT_DEVICES_KEY_ID,
+            public_keys=api_settings.JWT_DEVICES_PUBLIC_KEYS,
+        )
+
+    return CompiledSettings(
+        permanent_token_auth=api_settings.JWT_PERMANENT_TOKEN_AUTH,
+        hash_permanent_tokens=api_settings.JWT_DEVICES_HASH_PERMANENT_TOKENS,
+        reuse_devices=api_settings.JWT_DEVICES_REUSE_DEVICES,
+        max_devices_per_user=api_settings.JWT_DEVICES_MAX_PER_USER,
+        eviction_policy=api_settings.JWT_DEVICES_EVICTION_POLICY,
+        expiration_delta=api_settings.JWT_PERMANENT_TOKEN_EXPIRATION_DELTA,
+        expiration_accuracy=api_settings.JWT_PERMANENT_TOKEN_EXPIRATION_ACCURACY,
+        kid_header=api_settings.JWT_DEVICES_KID_HEADER,
+        keyring=keyring,
+        permanent_token_views=tuple(api_settings.JWT_DEVICES_PERMANENT_TOKEN_VIEWS),
+        payload_handler=api_settings.JWT_DEVICES_PAYLOAD_HANDLER,
+        encode_handler=api_settings.JWT_DEVICES_ENCODE_HANDLER,
+        encode_handler_accepts_device=utils.handler_accepts_device(api_settings.JWT_DEVICES_ENCODE_HANDLER),
+        decode_handler=decode_handler,
+        adecode_handler=adecode_handler,
+        response_payload_handler=api_settings.JWT_DEVICES_RESPONSE_PAYLOAD_HANDLER,
+        secret_cache_ttl=api_settings.JWT_DEVICES_SECRET_CACHE_TTL.total_seconds(),
+        secret_store_cache_ttl=api_settings.JWT_DEVICES_SECRET_STORE_CACHE_TTL.total_seconds(),
+        secret_negative_ttl=api_settings.JWT_DEVICES_SECRET_NEGATIVE_TTL.total_seconds(),
+        activity_flush_interval=api_settings.JWT_DEVICES_ACTIVITY_FLUSH_INTERVAL.total_seconds(),
+        secret_store=api_settings.JWT_DEVICES_SECRET_STORE,
+        activity_tracker=api_settings.JWT_DEVICES_ACTIVITY_TRACKER,
+        revocation_list=api_settings.JWT_DEVICES_REVOCATION_LIST,
+        metrics_backend=api_settings.JWT_DEVICES_METRICS_BACKEND,
+        pagination_class=api_settings.JWT_DEVICES_PAGINATION_CLASS,
+    )
+
+
+def get_compiled_settings():
+    """
+    Returns the `CompiledSettings` snapshot, compiled on first use and again after the `JWT_DEVICES` (or the
+    `REST_FRAMEWORK`) setting changes.
+    """
+    global _compiled_settings
+
+    compiled = _compiled_settings
+    if compiled is None:
+        compiled = _compiled_settings = compile_settings()
+    return compiled
+
+
+def get_permanent_token_views():
+    """
+    Returns the frozenset of the view classes accepting the Permanent-Token header, imported on first use (when the
+    views are loaded already) and again after the settings change.
+    """
+    global _permanent_token_views
+
+    views = _permanent_token_views
+    if views is None:
+        views = _permanent_token_views = frozenset(
+            import_from_string(view, "JWT_DEVICES_PERMANENT_TOKEN_VIEWS") if isinstance(view, str) else view
+            for view in get_compiled_settings().permanent_token_views
+        )
+    return views
+
+
+class LazyInstance(object):
+    """
+    The instance of the class in the `field` of the compiled settings shared by the process, built on first use and
+    dropped when the settings change. `get()` returns None when the setting is None. `on_create` and `on_reset` are
+    called with the instance once it is built and once it is dropped.
+    """
+    registry = []
+
+    def __init__(self, field, on_create=None, on_reset=None):
+        self.field = field
+        self.on_create = on_create
+        self.on_reset = on_reset
+        self._instance = None
+        self._lock = threading.Lock()
+        LazyInstance.registry.append(self)
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            instance_class = getattr(get_compiled_settings(), self.field)
+            if instance_class is None:
+                return None
+
+            with self._lock:
+                if self._instance is None:
+                    self._instance = instance_class()
+                    if self.on_create is not None:
+                        self.on_create(self._instance)
+                instance = self._instance
+        return instance
+
+    def reset(self):
+        with self._lock:
+            instance, self._instance = self._instance, None
+        if instance is not None and self.on_reset is not None:
+            self.on_reset(instance)
+
+
+def reload_api_settings(*args, **kwargs):
+    global _compiled_settings, _permanent_token_views
+
+    if kwargs["setting"] in ("JWT_DEVICES", "REST_FRAMEWORK"):
+        api_settings.reload()
+        _compiled_settings = None
+        _permanent_token_views = None
+        for lazy_instance in LazyInstance.registry:
+            lazy_instance.reset()
+
+
+setting_changed.connect(reload_api_settings)
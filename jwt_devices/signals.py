@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from jwt_devices.models import Device
+from jwt_devices.revocation import revoke_devices
+from jwt_devices.stores import invalidate_secret
+
+
+@receiver(post_save, sender=Device, dispatch_uid="jwt_devices_invalidate_secret_on_save")
+@receiver(post_delete, sender=Device, dispatch_uid="jwt_devices_invalidate_secret_on_delete")
+def invalidate_device_secret(sender, instance, **kwargs):
+    invalidate_secret(instance.pk)
+
+
+@receiver(post_delete, sender=Device, dispatch_uid="jwt_devices_revoke_on_delete")
+def revoke_device(sender, instance, **kwargs):
+    revoke_devices([instance.pk])
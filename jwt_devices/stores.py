@@ -0,0 +1,225 @@
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.db import router, transaction
+
+from jwt_devices.cache import LRUCache
+from jwt_devices.compat import HAS_ON_COMMIT, acache, aquery
+from jwt_devices.models import Device
+from jwt_devices.settings import LazyInstance, api_settings, get_compiled_settings
+
+# marks a device that does not exist; real secrets are never empty
+MISSING = ""
+
+
+class DatabaseSecretStore(object):
+    """
+    Secret store reading the device secret straight from the database on every lookup.
+    """
+
+    def get_secret(self, device_id):
+        """
+        Returns the hex encoded JWT secret of the device or None if the device does not exist.
+        """
+        return self.load_secret(device_id) or None
+
+    def load_secret(self, device_id):
+        try:
+            return Device.objects.values_list("jwt_secret", flat=True).get(pk=device_id).hex
+        except (Device.DoesNotExist, TypeError, ValueError):
+            return MISSING
+
+    async def aget_secret(self, device_id):
+        """
+        Async variant of `get_secret()`, using the async ORM and cache APIs where available.
+        """
+        return (await self.aload_secret(device_id)) or None
+
+    async def aload_secret(self, device_id):
+        try:
+            secret = await aquery(Device.objects.values_list("jwt_secret", flat=True), "get", pk=device_id)
+        except (Device.DoesNotExist, TypeError, ValueError):
+            return MISSING
+        return secret.hex
+
+    def invalidate(self, device_id):
+        pass
+
+    def invalidate_many(self, device_ids):
+        for device_id in device_ids:
+            self.invalidate(device_id)
+
+
+class LocalMemorySecretStore(DatabaseSecretStore):
+    """
+    Secret store keeping the secrets in a per-process LRU cache in front of the database.
+    """
+
+    def __init__(self):
+        config = get_compiled_settings()
+        self.local_ttl = config.secret_cache_ttl
+        self.negative_ttl = min(config.secret_negative_ttl, self.local_ttl)
+        self.local_cache = LRUCache(api_settings.JWT_DEVICES_SECRET_CACHE_SIZE, self.local_ttl)
+
+    def get_secret(self, device_id):
+        key = str(device_id)
+        secret = self.local_cache.get(key)
+        if secret is None:
+            secret = self.load_secret(device_id)
+            self.local_cache.set(key, secret, self.negative_ttl if secret == MISSING else None)
+        return secret or None
+
+    async def aget_secret(self, device_id):
+        key = str(device_id)
+        secret = self.local_cache.get(key)
+        if secret is None:
+            secret = await self.aload_secret(device_id)
+            self.local_cache.set(key, secret, self.negative_ttl if secret == MISSING else None)
+        return secret or None
+
+    def invalidate(self, device_id):
+        self.local_cache.delete(str(device_id))
+
+
+class CacheSecretStore(DatabaseSecretStore):
+    """
+    Secret store sharing the secrets between processes with the Django cache framework.
+    The cache is selected with the `JWT_DEVICES_SECRET_STORE_CACHE` alias.
+    """
+    key_prefix = "jwt_devices:secret:"
+
+    def __init__(self):
+        self.cache_alias = api_settings.JWT_DEVICES_SECRET_STORE_CACHE
+        config = get_compiled_settings()
+        self.shared_ttl = config.secret_store_cache_ttl
+        self.shared_negative_ttl = config.secret_negative_ttl
+
+    @property
+    def shared_cache(self):
+        return caches[self.cache_alias]
+
+    def get_cache_key(self, device_id):
+        return "{}{}".format(self.key_prefix, device_id)
+
+    def get_secret(self, device_id):
+        return self.get_shared_secret(device_id) or None
+
+    def get_shared_secret(self, device_id):
+        key = self.get_cache_key(device_id)
+        secret = self.shared_cache.get(key)
+        if secret is None:
+            secret = self.load_secret(device_id)
+            self.shared_cache.set(key, secret, self.shared_negative_ttl if secret == MISSING else self.shared_ttl)
+        return secret
+
+    async def aget_secret(self, device_id):
+        return (await self.aget_shared_secret(device_id)) or None
+
+    async def aget_shared_secret(self, device_id):
+        key = self.get_cache_key(device_id)
+        cache = self.shared_cache
+        secret = await acache(cache, "get", key)
+        if secret is None:
+            secret = await self.aload_secret(device_id)
+            await acache(cache, "set", key, secret, self.shared_negative_ttl if secret == MISSING else self.shared_ttl)
+        return secret
+
+    def invalidate(self, device_id):
+        self.shared_cache.delete(self.get_cache_key(device_id))
+
+    def invalidate_many(self, device_ids):
+        self.shared_cache.delete_many([self.get_cache_key(device_id) for device_id in device_ids])
+
+
+class TieredSecretStore(CacheSecretStore, LocalMemorySecretStore):
+    """
+    Secret store checking the per-process LRU cache first and the shared Django cache second.
+    Keep `JWT_DEVICES_SECRET_CACHE_TTL` short, as invalidations only reach the local cache of the current process.
+    """
+
+    def __init__(self):
+        CacheSecretStore.__init__(self)
+        LocalMemorySecretStore.__init__(self)
+
+    def get_secret(self, device_id):
+        key = str(device_id)
+        secret = self.local_cache.get(key)
+        if secret is None:
+            secret = self.get_shared_secret(device_id)
+            self.local_cache.set(key, secret, self.negative_ttl if secret == MISSING else None)
+        return secret or None
+
+    async def aget_secret(self, device_id):
+        key = str(device_id)
+        secret = self.local_cache.get(key)
+        if secret is None:
+            secret = await self.aget_shared_secret(device_id)
+            self.local_cache.set(key, secret, self.negative_ttl if secret == MISSING else None)
+        return secret or None
+
+    def invalidate(self, device_id):
+        LocalMemorySecretStore.invalidate(self, device_id)
+        CacheSecretStore.invalidate(self, device_id)
+
+    def invalidate_many(self, device_ids):
+        device_ids = list(device_ids)
+        for device_id in device_ids:
+            LocalMemorySecretStore.invalidate(self, device_id)
+        CacheSecretStore.invalidate_many(self, device_ids)
+
+
+_secret_store = LazyInstance("secret_store")
+
+
+def get_secret_store():
+    """
+    Returns the `JWT_DEVICES_SECRET_STORE` instance looking up the device secrets.
+    """
+    return _secret_store.get()
+
+
+_invalidation = threading.local()
+
+
+def _invalidate(method, *args):
+    def run():
+        getattr(get_secret_store(), method)(*args)
+
+    # right away for the lookups within the transaction, and again after the commit, as a lookup from another
+    # connection may cache the secret it still reads until then
+    run()
+    using = router.db_for_write(Device)
+    if HAS_ON_COMMIT and transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(run, using=using)
+
+
+def invalidate_secret(device_id):
+    """
+    Invalidates the secret of the device in the secret store, or defers it to the end of `bulk_invalidation()`.
+    Within a transaction, the secret is invalidated again once the transaction is committed.
+    """
+    pending = getattr(_invalidation, "pending", None)
+    if pending is not None:
+        pending.add(device_id)
+    else:
+        _invalidate("invalidate", device_id)
+
+
+@contextmanager
+def bulk_invalidation():
+    """
+    Collects the devices invalidated within the block, e.g. by deleting many devices, and invalidates their secrets
+    with one `invalidate_many()` call at the end of the block.
+    """
+    if getattr(_invalidation, "pending", None) is not None:
+        yield
+        return
+
+    _invalidation.pending = set()
+    try:
+        yield
+    finally:
+        pending, _invalidation.pending = _invalidation.pending, None
+        if pending:
+            _invalidate("invalidate_many", pending)
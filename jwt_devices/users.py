@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+
+
+class TokenUser(object):
+    """
+    Minimal user built from the signed claims of a JWT token: `user_id`, `username` and `is_active`.
+    Any other attribute loads the user from the database on first access and is read from the loaded user.
+    """
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, payload, username=None):
+        self.pk = self.id = payload.get("user_id")
+        self.username = username if username is not None else payload.get("username")
+        self.is_active = payload.get("is_active", True)
+        self._user = None
+
+    def __getattr__(self, name):
+        # only called for attributes missing in the claims
+        if name.startswith("__") or name == "_user":
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+    def __str__(self):
+        return str(self.username)
+
+    def __eq__(self, other):
+        return isinstance(other, (TokenUser, get_user_model())) and self.pk == other.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def get_username(self):
+        return self.username
+
+    def get_user(self):
+        if self._user is None:
+            self._user = get_user_model()._default_manager.get(pk=self.pk)
+        return self._user
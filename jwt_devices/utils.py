@@ -1,33 +1,105 @@
+import inspect
+import json
+import re
+import uuid
+from collections.abc import Mapping
+
 import jwt
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
-from rest_framework.exceptions import NotFound
+from jwt.utils import merge_dict
 from rest_framework_jwt.settings import api_settings as rfj_settings
 
+from jwt_devices.metrics import timed
 from jwt_devices.models import Device
+from jwt_devices.revocation import bulk_revocation, get_revocation_list
+from jwt_devices.settings import get_compiled_settings
+from jwt_devices.stores import bulk_invalidation, get_secret_store, invalidate_secret
 
-jwt_payload_handler = rfj_settings.JWT_PAYLOAD_HANDLER
-jwt_response_payload_handler = rfj_settings.JWT_RESPONSE_PAYLOAD_HANDLER
+# orderings of the devices to keep for every JWT_DEVICES_EVICTION_POLICY
+EVICTION_POLICIES = {
+    "least_recently_used": ("-last_request_datetime", "-id"),
+    "oldest": ("-created", "-id"),
+}
 
+# PyJWT parses the token on every decode() call, the private steps below let the handler parse it only once
+_jwt = jwt.PyJWT()
 
-def jwt_devices_get_secret_key(payload=None):
-    try:
-        return Device.objects.get(pk=payload.get("device_id")).jwt_secret.hex
-    except Device.DoesNotExist:
-        raise NotFound(_("Permanent token has expired."))
+
+def _expired_token_error():
+    # rest_framework.exceptions pulls in the serializers, so it is only imported once a token is rejected
+    from rest_framework.exceptions import NotFound
+    return NotFound(_("Permanent token has expired."))
+
+
+def jwt_devices_get_secret_key(payload=None, device=None):
+    if device is not None:
+        return device.jwt_secret.hex
+
+    return _get_device_secret(payload.get("device_id"))
+
+
+# the ASCII digits only, str.isdigit() and int() accept other Unicode digits too
+DEVICE_ID_RE = re.compile(r"[0-9]{1,19}")
+
+
+def _normalize_device_id(device_id):
+    """
+    Returns the device id taken from an unverified token as an int, or None if it can't be the primary key of a
+    device, so crafted ids never reach the secret store and its caches.
+    """
+    if isinstance(device_id, str) and DEVICE_ID_RE.fullmatch(device_id):
+        device_id = int(device_id)
+    if type(device_id) is not int or not 0 < device_id < 2 ** 63:
+        return None
+    return device_id
+
+
+def _get_device_secret(device_id):
+    device_id = _normalize_device_id(device_id)
+    if device_id is None:
+        raise _expired_token_error()
+    with timed("secret_lookup"):
+        secret = get_secret_store().get_secret(device_id)
+    if secret is None:
+        raise _expired_token_error()
+    return secret
 
 
 def jwt_devices_payload_handler(user, device=None):
-    payload = jwt_payload_handler(user)
+    payload = rfj_settings.JWT_PAYLOAD_HANDLER(user)
+    payload["is_active"] = getattr(user, "is_active", True)
     if device:
         payload["device_id"] = str(device.pk)
+    if get_compiled_settings().revocation_list is not None:
+        # lets a single token be revoked with revoke_tokens()
+        payload["jti"] = uuid.uuid4().hex
     return payload
 
 
-def jwt_devices_encode_handler(payload):
+def jwt_devices_encode_handler(payload, device=None):
+    """
+    Encodes the payload with the secret of the device. Pass the device if it is already in hand to avoid looking up
+    its secret again. With `JWT_DEVICES_KID_HEADER` enabled the device id is also set as the `kid` header.
+    With `JWT_DEVICES_ALGORITHM` set the payload is signed with the server private key instead, the `kid` header
+    being the id of the key.
+    """
+    config = get_compiled_settings()
+    if config.keyring is not None:
+        keyring = config.keyring
+        return jwt.encode(
+            payload, keyring.signing_key, keyring.algorithm, headers={"kid": keyring.signing_key_id}
+        ).decode("utf-8")
+
+    headers = None
+    if config.kid_header and "device_id" in payload:
+        headers = {"kid": payload["device_id"]}
+
     return jwt.encode(
         payload,
-        jwt_devices_get_secret_key(payload),
-        rfj_settings.JWT_ALGORITHM
+        jwt_devices_get_secret_key(payload, device=device),
+        rfj_settings.JWT_ALGORITHM,
+        headers=headers
     ).decode("utf-8")
 
 
@@ -35,7 +107,7 @@ def jwt_devices_response_payload_handler(token, user=None, request=None, **kwarg
     """
     Returns the response data for both the login and refresh views.
     """
-    data = jwt_response_payload_handler(token, user, request)
+    data = rfj_settings.JWT_RESPONSE_PAYLOAD_HANDLER(token, user, request)
     permanent_token = kwargs.get("permanent_token")
     if permanent_token:
         data["permanent_token"] = permanent_token
@@ -46,22 +118,128 @@ def jwt_devices_response_payload_handler(token, user=None, request=None, **kwarg
     return data
 
 
+def _parse_payload(payload_data):
+    try:
+        payload = json.loads(payload_data.decode("utf-8"))
+    except ValueError as e:
+        raise jwt.DecodeError("Invalid payload string: {}".format(e))
+    if not isinstance(payload, Mapping):
+        raise jwt.DecodeError("Invalid payload string: must be a json object")
+
+    return payload
+
+
+def get_token_device_id(token):
+    """
+    Returns the device id of a token, without verifying it. Use only with tokens already verified.
+    """
+    payload_data, _, header, _ = _jwt._load(token)
+    if _get_server_key(header) is None and header.get("kid"):
+        return header["kid"]
+    return _parse_payload(payload_data).get("device_id")
+
+
+def _get_server_key(header):
+    """
+    Returns the algorithm and the server public key verifying a token with the given header, None if the token is
+    signed with the secret of its device.
+    """
+    keyring = get_compiled_settings().keyring
+    kid = header.get("kid")
+    if keyring is None or not isinstance(kid, str):
+        return None
+    public_key = keyring.public_keys.get(kid)
+    if public_key is None:
+        return None
+    return keyring.algorithm, public_key
+
+
+def _load_token(token):
+    """
+    Parses the token and returns its parts, the id of its device, the payload if it had to be parsed to get the id
+    and the algorithm and the public key if the token is signed with a server key.
+    The device is identified by the `kid` header if present, otherwise by the `device_id` claim, and is None if the
+    id is not valid.
+    """
+    payload_data, signing_input, header, signature = _jwt._load(token)
+    server_key = _get_server_key(header)
+    device_id = header.get("kid") if server_key is None else None
+    payload = None
+    if device_id is None:
+        payload = _parse_payload(payload_data)
+        device_id = payload.get("device_id")
+    device_id = _normalize_device_id(device_id)
+
+    return (payload_data, signing_input, header, signature), device_id, payload, server_key
+
+
+def _verify_token(parts, device_id, payload, secret_key, algorithm=None):
+    payload_data, signing_input, header, signature = parts
+    if rfj_settings.JWT_VERIFY:
+        # only the algorithm of the key is allowed, so a public key can't be used as an HMAC secret
+        _jwt._verify_signature(
+            payload_data, signing_input, header, signature, secret_key, [algorithm or rfj_settings.JWT_ALGORITHM])
+
+    if payload is None:
+        # the payload of a token with the kid header is only parsed once the signature is verified
+        payload = _parse_payload(payload_data)
+        if "device_id" in payload and _normalize_device_id(payload["device_id"]) != device_id:
+            raise jwt.InvalidTokenError("The kid header does not match the device_id claim.")
+
+    if rfj_settings.JWT_VERIFY:
+        options = merge_dict(_jwt.options, {"verify_exp": rfj_settings.JWT_VERIFY_EXPIRATION})
+        _jwt._validate_claims(
+            payload,
+            options,
+            audience=rfj_settings.JWT_AUDIENCE,
+            issuer=rfj_settings.JWT_ISSUER,
+            leeway=rfj_settings.JWT_LEEWAY
+        )
+
+    return payload
+
+
 def jwt_devices_decode_handler(token):
-    options = {
-        "verify_exp": rfj_settings.JWT_VERIFY_EXPIRATION,
-    }
-    # get user from token, BEFORE verification, to get user secret key
-    unverified_payload = jwt.decode(token, None, False)
-    return jwt.decode(
-        token,
-        jwt_devices_get_secret_key(unverified_payload),
-        rfj_settings.JWT_VERIFY,
-        options=options,
-        leeway=rfj_settings.JWT_LEEWAY,
-        audience=rfj_settings.JWT_AUDIENCE,
-        issuer=rfj_settings.JWT_ISSUER,
-        algorithms=[rfj_settings.JWT_ALGORITHM]
-    )
+    """
+    Parses the token once, looks up the secret of the device and then verifies the signature and the registered
+    claims. The device is identified by the `kid` header if present, so the payload is only parsed once the signature
+    is verified, otherwise by the `device_id` claim. The tokens signed with a server key are verified with its public
+    key, without looking up the device. The tokens revoked in `JWT_DEVICES_REVOCATION_LIST` are rejected.
+    """
+    parts, device_id, payload, server_key = _load_token(token)
+    if server_key is not None:
+        algorithm, public_key = server_key
+        payload = _verify_token(parts, device_id, payload, public_key, algorithm)
+    else:
+        payload = _verify_token(parts, device_id, payload, _get_device_secret(device_id))
+
+    revocation_list = get_revocation_list()
+    if revocation_list is not None and revocation_list.is_revoked(payload.get("device_id"), payload.get("jti")):
+        raise jwt.InvalidTokenError("The token has been revoked.")
+    return payload
+
+
+async def jwt_devices_adecode_handler(token):
+    """
+    Async variant of `jwt_devices_decode_handler`, looking up the secret with `aget_secret()` of the secret store.
+    """
+    parts, device_id, payload, server_key = _load_token(token)
+    if server_key is not None:
+        algorithm, public_key = server_key
+        payload = _verify_token(parts, device_id, payload, public_key, algorithm)
+    else:
+        secret = None
+        if device_id is not None:
+            with timed("secret_lookup"):
+                secret = await get_secret_store().aget_secret(device_id)
+        if secret is None:
+            raise _expired_token_error()
+        payload = _verify_token(parts, device_id, payload, secret)
+
+    revocation_list = get_revocation_list()
+    if revocation_list is not None and await revocation_list.ais_revoked(payload.get("device_id"), payload.get("jti")):
+        raise jwt.InvalidTokenError("The token has been revoked.")
+    return payload
 
 
 def get_device_details(headers):
@@ -74,3 +252,83 @@ def get_device_details(headers):
         device_details = user_agent
 
     return device_name, device_details
+
+
+def handler_accepts_device(handler):
+    """
+    Checks if a (possibly custom) handler can be called with the `device` keyword argument.
+    """
+    try:
+        parameters = inspect.signature(handler).parameters
+    except (TypeError, ValueError):
+        return False
+
+    return "device" in parameters or any(
+        parameter.kind == inspect.Parameter.VAR_KEYWORD for parameter in parameters.values())
+
+
+def get_reusable_device(user, headers, device_name, device_details):
+    """
+    Returns the device of the user identified by the `Device-Id` header, or the most recently used device of the user
+    with the same name and details.
+    """
+    devices = Device.objects.filter(user_id=user.pk)
+    device_id = headers.get("HTTP_DEVICE_ID")
+    if device_id:
+        try:
+            return devices.filter(pk=device_id).first()
+        except (TypeError, ValueError):
+            return None
+
+    return devices.filter(name=device_name, details=device_details).order_by("-last_request_datetime", "-id").first()
+
+
+def rotate_device_credentials(device, **values):
+    """
+    Replaces the permanent token and the JWT secret of the device with one UPDATE, invalidating the credentials issued
+    before. Any other field values passed are updated as well.
+    """
+    device.permanent_token = device.generate_key()
+    device.permanent_token_digest = device.hash_token(device.permanent_token)
+    device.jwt_secret = uuid.uuid4()
+    values.setdefault("last_request_datetime", timezone.now())
+    for field, value in values.items():
+        setattr(device, field, value)
+
+    Device.objects.filter(pk=device.pk).update(
+        permanent_token=None if get_compiled_settings().hash_permanent_tokens else device.permanent_token,
+        permanent_token_digest=device.permanent_token_digest,
+        jwt_secret=device.jwt_secret,
+        **values
+    )
+    # the UPDATE does not send the signals invalidating the secret stores
+    invalidate_secret(device.pk)
+    return device
+
+
+def evict_devices(user):
+    """
+    Deletes the devices of the user above `JWT_DEVICES_MAX_PER_USER`, chosen by `JWT_DEVICES_EVICTION_POLICY`.
+    """
+    compiled_settings = get_compiled_settings()
+    max_devices = compiled_settings.max_devices_per_user
+    if not max_devices:
+        return 0
+
+    devices = Device.objects.filter(user_id=user.pk)
+    ordering = EVICTION_POLICIES[compiled_settings.eviction_policy]
+    evicted = list(devices.order_by(*ordering).values_list("pk", flat=True)[max_devices:])
+    if not evicted:
+        return 0
+
+    return delete_devices(devices.filter(pk__in=evicted))
+
+
+def delete_devices(queryset):
+    """
+    Deletes the devices with one DELETE query, invalidates their secrets and revokes their tokens at once, returns the
+    number of deleted devices.
+    """
+    with bulk_invalidation(), bulk_revocation():
+        _, deleted_per_model = queryset.delete()
+    return deleted_per_model.get(Device._meta.label, 0)
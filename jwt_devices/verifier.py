@@ -0,0 +1,119 @@
+# Offline verification of the tokens signed in the asymmetric mode, for services other than the one issuing them.
+# The module does not import Django, only PyJWT and the cryptography package are required.
+import json
+import logging
+import re
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import jwt
+
+from jwt_devices.jwk import jwk_to_public_key
+
+logger = logging.getLogger("jwt_devices.verifier")
+
+MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class JWKSVerifier(object):
+    """
+    Verifies the tokens with the public keys published by the `json_web_key_set` view at `url`, kept in memory.
+
+    The keys are fetched again once the `max-age` of the response expires (`max_age` seconds if the response has no
+    `Cache-Control` header), with the ETag of the previous response, and when a token is signed with an unknown key,
+    at most once per `min_refresh_interval` seconds. If fetching the keys fails, the keys fetched before are used.
+    """
+
+    def __init__(self, url, max_age=300, min_refresh_interval=30, timeout=5, audience=None, issuer=None, leeway=0,
+                 verify_expiration=True):
+        self.url = url
+        self.max_age = max_age
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.audience = audience
+        self.issuer = issuer
+        self.leeway = leeway
+        self.verify_expiration = verify_expiration
+
+        self._keys = {}
+        self._etag = None
+        self._expires = None
+        self._fetched = None
+        self._lock = threading.Lock()
+
+    def fetch(self, etag=None):
+        """
+        Requests the key set and returns the status, the headers with lowercase names and the body of the response.
+        """
+        request = Request(self.url, headers={"If-None-Match": etag} if etag else {})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return response.status, {k.lower(): v for k, v in response.headers.items()}, response.read()
+        except HTTPError as e:
+            if e.code != 304:
+                raise
+            return e.code, {k.lower(): v for k, v in e.headers.items()}, b""
+
+    def _needs_refresh(self, kid, now):
+        if self._expires is None or now >= self._expires:
+            return True
+        return kid not in self._keys and now - self._fetched >= self.min_refresh_interval
+
+    def _refresh(self, now):
+        self._fetched = now
+        status, headers, body = self.fetch(self._etag)
+        if status != 304:
+            keys = {}
+            for jwk in json.loads(body.decode("utf-8"))["keys"]:
+                try:
+                    keys[jwk["kid"]] = (jwk["alg"], jwk_to_public_key(jwk))
+                except (KeyError, ValueError):
+                    logger.warning("Skipping the unsupported key %s", jwk.get("kid"))
+            self._keys = keys
+            self._etag = headers.get("etag")
+
+        match = MAX_AGE_RE.search(headers.get("cache-control", ""))
+        self._expires = now + (int(match.group(1)) if match else self.max_age)
+
+    def get_key(self, kid):
+        """
+        Returns the algorithm and the public key of the key id, fetching the key set if needed.
+        """
+        now = time.monotonic()
+        if self._needs_refresh(kid, now):
+            with self._lock:
+                if self._needs_refresh(kid, now):
+                    try:
+                        self._refresh(now)
+                    except (OSError, ValueError, KeyError):
+                        if not self._keys:
+                            raise
+                        # keep using the previous keys, the key set is fetched again after min_refresh_interval
+                        logger.warning("Fetching the key set from %s failed", self.url, exc_info=True)
+                        self._expires = now + self.min_refresh_interval
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown key id.")
+        return key
+
+    def verify(self, token):
+        """
+        Returns the payload of a valid token, raises a subclass of `jwt.InvalidTokenError` otherwise. Tokens of
+        inactive users are rejected.
+        """
+        algorithm, public_key = self.get_key(jwt.get_unverified_header(token).get("kid"))
+        payload = jwt.decode(
+            token,
+            public_key,
+            algorithms=[algorithm],
+            audience=self.audience,
+            issuer=self.issuer,
+            leeway=self.leeway,
+            options={"verify_exp": self.verify_expiration}
+        )
+        if not payload.get("is_active", True):
+            raise jwt.InvalidTokenError("User account is disabled.")
+        return payload
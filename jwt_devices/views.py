@@ -1,20 +1,31 @@
+import hashlib
+import json
 from datetime import datetime
 
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import mixins, status, viewsets
-from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound, ValidationError
 from rest_framework.generics import DestroyAPIView, GenericAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.serializers import as_serializer_error
+from rest_framework.views import APIView
 from rest_framework_jwt.settings import api_settings as rfj_settings
 from rest_framework_jwt.views import ObtainJSONWebToken as OriginalObtainJSONWebToken
 
+from jwt_devices.authentication import StatelessPermanentTokenAuthentication
+from jwt_devices.compat import aquery
+from jwt_devices.metrics import timed
 from jwt_devices.models import Device
-from jwt_devices.serializers import DeviceSerializer, DeviceTokenRefreshSerializer, JSONWebTokenSerializer
-from jwt_devices.settings import api_settings
+from jwt_devices.serializers import (DeviceBulkLogoutSerializer, DeviceSerializer, DeviceTokenRefreshSerializer,
+                                     JSONWebTokenSerializer)
+from jwt_devices.settings import api_settings, get_compiled_settings
+from jwt_devices.utils import delete_devices, get_token_device_id
 
 jwt_response_payload_handler = rfj_settings.JWT_RESPONSE_PAYLOAD_HANDLER
-jwt_devices_response_payload_handler = api_settings.JWT_DEVICES_RESPONSE_PAYLOAD_HANDLER
 
 
 class ObtainJSONWebTokenAPIView(OriginalObtainJSONWebToken):
@@ -35,8 +46,9 @@ class ObtainJSONWebTokenAPIView(OriginalObtainJSONWebToken):
             if device:
                 kwargs.update(dict(permanent_token=device.permanent_token, device_id=device.id))
 
-            if api_settings.JWT_PERMANENT_TOKEN_AUTH:
-                response_data = jwt_devices_response_payload_handler(token, user, request, **kwargs)
+            config = get_compiled_settings()
+            if config.permanent_token_auth:
+                response_data = config.response_payload_handler(token, user, request, **kwargs)
             else:
                 response_data = jwt_response_payload_handler(token, user, request)
 
@@ -63,10 +75,40 @@ class DeviceRefreshJSONWebToken(GenericAPIView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.META)
         if serializer.is_valid(raise_exception=True):
-            data = jwt_devices_response_payload_handler(request=request, **serializer.validated_data)
+            data = get_compiled_settings().response_payload_handler(request=request, **serializer.validated_data)
             return Response(data, status=status.HTTP_200_OK)
 
 
+class DeviceJSONWebKeySet(APIView):
+    """Publish the verification keys
+    API view returning the public keys of the asymmetric mode (`JWT_DEVICES_ALGORITHM`) as a JSON Web Key Set, for the
+    services verifying the tokens themselves, e.g. with `jwt_devices.verifier.JWKSVerifier`. The response can be
+    cached for `JWT_DEVICES_JWKS_MAX_AGE` and revalidated with its ETag.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        from jwt_devices.keys import get_jwks
+
+        keyring = get_compiled_settings().keyring
+        if keyring is None:
+            raise NotFound(_("The tokens are not signed with public keys."))
+
+        jwks = get_jwks(keyring)
+        etag = quote_etag(hashlib.sha256(json.dumps(jwks, sort_keys=True).encode("utf-8")).hexdigest()[:32])
+        # parse_etags() returns the quoted ETags since Django 1.11 and the unquoted ones before
+        if_none_match = {tag.strip('"') for tag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))}
+        if etag.strip('"') in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = Response(jwks, status=status.HTTP_200_OK)
+
+        response["ETag"] = etag
+        patch_cache_control(response, public=True, max_age=int(api_settings.JWT_DEVICES_JWKS_MAX_AGE.total_seconds()))
+        return response
+
+
 class DeviceLogout(DestroyAPIView):
     """Logout user by deleting Device.
     The DeviceLogout view requires the Device-Id header to be set in the request headers.
@@ -76,25 +118,129 @@ class DeviceLogout(DestroyAPIView):
 
     def get_object(self):
         try:
-            return self.get_queryset().get(user=self.request.user, id=self.request.META["HTTP_DEVICE_ID"])
+            return self.get_queryset().get(user_id=self.request.user.pk, id=self.request.META["HTTP_DEVICE_ID"])
         except (KeyError, ValueError):
             raise ValidationError(_("Device-Id header must be present in the request headers."))
         except Device.DoesNotExist:
             raise NotFound(_("Device does not exist."))
 
 
+class DeviceBulkLogout(GenericAPIView):
+    """Logout many devices at once.
+    API view used to delete the devices listed in `ids`, or all devices of the user, with one query, e.g.
+    `{"keep_current": true}` logs out all devices except the one used to send the request.
+    """
+    queryset = Device.objects.all()
+    serializer_class = DeviceBulkLogoutSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        devices = self.get_queryset().filter(user_id=request.user.pk)
+        if "ids" in serializer.validated_data:
+            devices = devices.filter(pk__in=serializer.validated_data["ids"])
+        if serializer.validated_data["keep_current"]:
+            current_device_id = get_token_device_id(request.auth) if request.auth else None
+            if current_device_id is None:
+                raise ValidationError(_("The request must be authenticated with a device token to keep it."))
+            devices = devices.exclude(pk=current_device_id)
+
+        return Response({"deleted": delete_devices(devices)}, status=status.HTTP_200_OK)
+
+
 class DeviceViewSet(mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
     """
-    Simple viewset to list and delete Device objects related to user.
+    Simple viewset to list and delete Device objects related to user, most recently used devices are listed first.
     """
-    queryset = Device.objects.all()
+    queryset = Device.objects.order_by("-last_request_datetime", "-id")
     serializer_class = DeviceSerializer
     permission_classes = [IsAuthenticated]
 
+    @property
+    def pagination_class(self):
+        return get_compiled_settings().pagination_class or viewsets.GenericViewSet.pagination_class
+
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        queryset = self.queryset.filter(user_id=self.request.user.pk)
+        if self.action == "list":
+            # the ordering fields are used by the cursor pagination, the credentials are never loaded
+            fields = self.get_serializer_class().get_requested_fields(self.request)
+            queryset = queryset.only("id", "last_request_datetime", *fields)
+        return queryset
+
+
+def _error_response(exc, request=None, authenticator=None):
+    """
+    Renders an APIException raised in an async view the same way as the DRF exception handler.
+    """
+    if isinstance(exc, ValidationError) and isinstance(exc.detail, dict):
+        data = as_serializer_error(exc)
+    elif isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {"detail": exc.detail}
+
+    response = JsonResponse(data, status=exc.status_code, safe=False)
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED and authenticator is not None:
+        response["WWW-Authenticate"] = authenticator.authenticate_header(request)
+    return response
+
+
+async def adevice_refresh_token(request):
+    """Refresh JWT token (async)
+    Async variant of `device_refresh_token` for ASGI deployments, using the async ORM where available.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    serializer = DeviceTokenRefreshSerializer()
+    try:
+        permanent_token = request.META.get("HTTP_PERMANENT_TOKEN")
+        if not permanent_token:
+            raise ValidationError({"HTTP_PERMANENT_TOKEN": _("This field is required.")})
+        with timed("refresh"):
+            token_data = serializer.get_token_data(await serializer.aget_device(permanent_token))
+    except APIException as exc:
+        return _error_response(exc)
+
+    return JsonResponse(get_compiled_settings().response_payload_handler(request=request, **token_data))
+
+
+async def adevice_logout(request):
+    """Logout user by deleting Device (async)
+    Async variant of `device_logout` for ASGI deployments. The request is authenticated from the token claims with
+    `StatelessPermanentTokenAuthentication`, so the user is not loaded from the database.
+    """
+    if request.method != "DELETE":
+        return HttpResponseNotAllowed(["DELETE"])
+
+    authenticator = StatelessPermanentTokenAuthentication()
+    try:
+        user_auth_tuple = await authenticator.aauthenticate(request)
+        if user_auth_tuple is None:
+            raise NotAuthenticated()
+
+        try:
+            devices = Device.objects.filter(user_id=user_auth_tuple[0].pk, id=request.META["HTTP_DEVICE_ID"])
+        except (KeyError, ValueError):
+            raise ValidationError(_("Device-Id header must be present in the request headers."))
+        deleted, _rows = await aquery(devices, "delete")
+        if not deleted:
+            raise NotFound(_("Device does not exist."))
+    except APIException as exc:
+        return _error_response(exc, request, authenticator)
+
+    return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
 
+# the views are authenticated with the Authorization header only
+adevice_refresh_token.csrf_exempt = True
+adevice_logout.csrf_exempt = True
 
 obtain_jwt_token = ObtainJSONWebTokenAPIView.as_view()
 device_refresh_token = DeviceRefreshJSONWebToken.as_view()
 device_logout = DeviceLogout.as_view()
+device_bulk_logout = DeviceBulkLogout.as_view()
+json_web_key_set = DeviceJSONWebKeySet.as_view()
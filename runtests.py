@@ -41,6 +41,11 @@ def isort_main():
     return ret
 
 
+def benchmark_main(args):
+    print("Running benchmarks")
+    return subprocess.call([sys.executable, "-m", "benchmarks.hot_paths"] + args)
+
+
 def split_class_and_function(string):
     class_string, function_string = string.split(".", 1)
     return "{} and {}".format(class_string, function_string)
@@ -58,6 +63,11 @@ def is_class(string):
 
 if __name__ == "__main__":
     """ test runner - to be used by tox """
+    if "--benchmark" in sys.argv:
+        # `runtests.py --benchmark [benchmark args]`
+        sys.argv.remove("--benchmark")
+        sys.exit(benchmark_main(sys.argv[1:]))
+
     try:
         sys.argv.remove("--nolint")
     except ValueError:
@@ -68,16 +68,22 @@ setup(
     packages=get_packages("jwt_devices"),
     package_data=get_package_data("jwt_devices"),
     zip_safe=False,
+    python_requires=">=3.5",
     install_requires=required_to_install,
+    extras_require={
+        "crypto": ["cryptography"],
+    },
     classifiers=[
         "Development Status :: 7 - Inactive",
         "Environment :: Web Environment",
         "Framework :: Django",
+        "Framework :: Django :: 1.10",
+        "Framework :: Django :: 1.11",
         "Intended Audience :: Developers",
         "Operating System :: OS Independent",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 2.7",
-        "Programming Language :: Python :: 3.4",
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
         "Programming Language :: Python :: 3.5",
         "Programming Language :: Python :: 3.6",
         "Topic :: Internet :: WWW/HTTP",
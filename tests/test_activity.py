@@ -0,0 +1,113 @@
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+from freezegun import freeze_time
+from rest_framework.test import APIClient
+from tests.test_utils import BaseTestCase
+
+from jwt_devices.activity import BufferedActivityTracker, CacheActivityTracker, write_activity
+from jwt_devices.models import Device
+
+
+class WriteActivityTests(BaseTestCase):
+    @freeze_time("2016-01-01 00:00:00")
+    def test_bulk_update(self):
+        now = datetime.now()
+        devices = [Device.objects.create(user=self.user, name="Android {}".format(index)) for index in range(3)]
+        Device.objects.filter(pk=devices[2].pk).update(last_request_datetime=now + timedelta(hours=2))
+
+        with self.assertNumQueries(1):
+            write_activity({
+                devices[0].pk: now + timedelta(hours=1),
+                devices[2].pk: now + timedelta(hours=1),
+            })
+
+        self.assertEqual(Device.objects.get(pk=devices[0].pk).last_request_datetime, now + timedelta(hours=1))
+        self.assertEqual(Device.objects.get(pk=devices[1].pk).last_request_datetime, now)
+        # the datetime is never moved back
+        self.assertEqual(Device.objects.get(pk=devices[2].pk).last_request_datetime, now + timedelta(hours=2))
+
+
+class ActivityTrackerTestMixin(object):
+    def setUp(self):
+        super(ActivityTrackerTestMixin, self).setUp()
+        cache.clear()
+
+    def test_authentication_tracks_activity(self):
+        with freeze_time("2016-01-01 00:00:00") as frozen_time:
+            client = APIClient()
+            response = client.post("/auth-token/", self.data, format="json")
+            device = Device.objects.get(pk=response.data["device_id"])
+            client.credentials(HTTP_AUTHORIZATION="JWT {}".format(response.data["token"]))
+
+            frozen_time.tick(delta=timedelta(seconds=10))
+            self.assertEqual(client.get("/devices/").status_code, 200)
+            # the activity is buffered until the flush interval passes
+            self.assertEqual(Device.objects.get(pk=device.pk).last_request_datetime, device.last_request_datetime)
+
+            frozen_time.tick(delta=timedelta(seconds=60))
+            self.assertEqual(client.get("/devices/").status_code, 200)
+            self.assertEqual(Device.objects.get(pk=device.pk).last_request_datetime, datetime.now())
+
+
+class BufferedActivityTrackerTests(ActivityTrackerTestMixin, BaseTestCase):
+    jwt_devices_settings = {"JWT_DEVICES_ACTIVITY_TRACKER": BufferedActivityTracker}
+
+
+class CacheActivityTrackerTests(ActivityTrackerTestMixin, BaseTestCase):
+    jwt_devices_settings = {"JWT_DEVICES_ACTIVITY_TRACKER": CacheActivityTracker}
+
+    @freeze_time("2016-01-01 00:00:00")
+    def test_flush_command(self):
+        device = Device.objects.create(user=self.user, name="Android")
+        when = device.last_request_datetime + timedelta(minutes=5)
+        # a separate tracker stands in for another process sharing the cache
+        CacheActivityTracker().touch(device.pk, when=when)
+        self.assertNotEqual(Device.objects.get(pk=device.pk).last_request_datetime, when)
+
+        call_command("flush_device_activity", stdout=StringIO())
+        self.assertEqual(Device.objects.get(pk=device.pk).last_request_datetime, when)
+
+    def test_flush_command_disabled(self):
+        with override_settings(JWT_DEVICES={}), self.assertRaises(CommandError):
+            call_command("flush_device_activity")
+
+    def test_flush_waits_for_events_on_their_way(self):
+        with freeze_time("2016-01-01 00:00:00") as frozen_time:
+            devices = [Device.objects.create(user=self.user, name="Android {}".format(index)) for index in range(2)]
+            when = datetime.now() + timedelta(minutes=5)
+            tracker = CacheActivityTracker()
+            # the sequence number is taken, but the event is not stored yet
+            cache.add(tracker.get_cache_key("sequence"), 0, timeout=None)
+            sequence = cache.incr(tracker.get_cache_key("sequence"))
+            tracker.touch(devices[1].pk, when=when)
+            tracker.flush()
+            self.assertEqual(Device.objects.get(pk=devices[1].pk).last_request_datetime, when)
+            self.assertEqual(cache.get(tracker.get_cache_key("flushed"), 0), sequence - 1)
+
+            cache.set(tracker.get_cache_key("event", sequence), (str(devices[0].pk), when, time.time()))
+            tracker.flush()
+            self.assertEqual(Device.objects.get(pk=devices[0].pk).last_request_datetime, when)
+            self.assertEqual(cache.get(tracker.get_cache_key("flushed")), sequence + 1)
+
+            # an event missing for longer than gap_timeout is skipped
+            cache.incr(tracker.get_cache_key("sequence"))
+            tracker.touch(devices[0].pk, when=when + timedelta(minutes=1))
+            frozen_time.tick(delta=timedelta(seconds=tracker.gap_timeout + 1))
+            tracker.flush()
+            self.assertEqual(cache.get(tracker.get_cache_key("flushed")), sequence + 3)
+
+    def test_sequence_started_again(self):
+        device = Device.objects.create(user=self.user, name="Android")
+        when = device.last_request_datetime + timedelta(minutes=5)
+        tracker = CacheActivityTracker()
+        cache.set(tracker.get_cache_key("flushed"), 100, timeout=None)
+        tracker.touch(device.pk, when=when)
+        self.assertIsNone(cache.get(tracker.get_cache_key("flushed")))
+
+        tracker.flush()
+        self.assertEqual(Device.objects.get(pk=device.pk).last_request_datetime, when)
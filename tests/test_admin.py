@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+from django.contrib.admin import site
+from django.contrib.auth.models import Permission
+from django.core.exceptions import PermissionDenied
+from django.test import RequestFactory
+from tests.test_utils import BaseTestCase, User
+
+from jwt_devices.admin import DeviceAdmin, EstimatedCountPaginator
+from jwt_devices.models import Device
+
+
+class DeviceAdminTests(BaseTestCase):
+    def setUp(self):
+        super(DeviceAdminTests, self).setUp()
+        self.admin = DeviceAdmin(Device, site)
+        self.request = self.get_request(["change_device", "delete_device"])
+        self.devices = [Device.objects.create(user=self.user, name="Android") for _ in range(3)]
+
+    def get_request(self, permissions):
+        user = User.objects.create_user("staff_{}".format("_".join(permissions)), is_staff=True)
+        user.user_permissions.set(Permission.objects.filter(content_type__app_label="jwt_devices",
+                                                            codename__in=permissions))
+        request = RequestFactory().get("/admin/jwt_devices/device/")
+        # the user is loaded again, without the cached permissions
+        request.user = User.objects.get(pk=user.pk)
+        return request
+
+    def test_revoke_devices(self):
+        with patch.object(self.admin, "message_user") as message_user:
+            self.admin.revoke_devices(self.request, Device.objects.filter(pk__in=[d.pk for d in self.devices[:2]]))
+        message_user.assert_called_once_with(self.request, "Revoked 2 device(s).")
+        self.assertEqual(list(Device.objects.all()), [self.devices[2]])
+        self.assertIn("revoke_devices", self.admin.get_actions(self.request))
+
+    def test_revoke_devices_without_delete_permission(self):
+        request = self.get_request(["change_device"])
+        self.assertNotIn("revoke_devices", self.admin.get_actions(request))
+        with self.assertRaises(PermissionDenied):
+            self.admin.revoke_devices(request, Device.objects.all())
+        self.assertEqual(Device.objects.count(), 3)
+
+    def test_user_link(self):
+        self.assertEqual(
+            self.admin.user_link(self.devices[0]),
+            '<a href="?user__id__exact={}">{}</a>'.format(self.user.pk, self.user))
+        self.assertTrue(self.admin.lookup_allowed("user__id__exact", str(self.user.pk)))
+
+    def test_user_link_keeps_filters(self):
+        request = RequestFactory().get("/admin/jwt_devices/device/", {"q": "And", "o": "2", "p": "3"})
+        user_link = self.admin.get_list_display(request)[1]
+        self.assertEqual(user_link.short_description, "user")
+        self.assertEqual(
+            user_link(self.devices[0]),
+            '<a href="?q=And&amp;o=2&amp;user__id__exact={}">{}</a>'.format(self.user.pk, self.user))
+
+    def test_search(self):
+        Device.objects.filter(pk=self.devices[0].pk).update(details="iPhone 6")
+        queryset, _ = self.admin.get_search_results(self.request, Device.objects.all(), "iph")
+        self.assertEqual(list(queryset), [self.devices[0]])
+        queryset, _ = self.admin.get_search_results(self.request, Device.objects.all(), "andr")
+        self.assertEqual(queryset.count(), 3)
+
+    def test_estimated_count_paginator_falls_back_to_count(self):
+        # no estimate on other databases than PostgreSQL
+        paginator = EstimatedCountPaginator(Device.objects.order_by("pk"), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 3)
+        self.assertEqual(paginator.num_pages, 2)
+
+        # nor for filtered querysets
+        queryset, _ = self.admin.get_search_results(self.request, Device.objects.order_by("pk"), "andr")
+        paginator = EstimatedCountPaginator(queryset, 2)
+        with self.assertNumQueries(0):
+            self.assertIsNone(paginator.get_estimated_count())
+        self.assertEqual(paginator.count, 3)
+
+        # a small table is counted exactly
+        with patch.object(EstimatedCountPaginator, "get_estimated_count", return_value=50):
+            self.assertEqual(EstimatedCountPaginator(Device.objects.order_by("pk"), 2).count, 3)
+
+    def test_estimated_count_paginator(self):
+        paginator = EstimatedCountPaginator(Device.objects.order_by("pk"), 100)
+        with patch.object(EstimatedCountPaginator, "get_estimated_count", return_value=2500000):
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 2500000)
@@ -0,0 +1,131 @@
+import asyncio
+import json
+from datetime import timedelta
+
+import jwt
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from freezegun import freeze_time
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+from tests.test_utils import BaseTestCase
+
+from jwt_devices.authentication import PermanentTokenAuthentication, StatelessPermanentTokenAuthentication
+from jwt_devices.middleware import PermittedHeadersMiddleware
+from jwt_devices.models import Device
+from jwt_devices.stores import LocalMemorySecretStore
+from jwt_devices.utils import (jwt_devices_adecode_handler, jwt_devices_decode_handler, jwt_devices_encode_handler,
+                               jwt_devices_payload_handler)
+from jwt_devices.views import adevice_logout, adevice_refresh_token, device_logout, device_refresh_token
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class AsyncDecodeHandlerTests(BaseTestCase):
+    def setUp(self):
+        super(AsyncDecodeHandlerTests, self).setUp()
+        self.device = Device.objects.create(user=self.user, name="Android")
+        self.token = jwt_devices_encode_handler(jwt_devices_payload_handler(self.user, device=self.device))
+
+    def test_decode(self):
+        self.assertEqual(run(jwt_devices_adecode_handler(self.token)), jwt_devices_decode_handler(self.token))
+
+        self.device.delete()
+        with self.assertRaises(NotFound):
+            run(jwt_devices_adecode_handler(self.token))
+
+        crafted = jwt.encode({"device_id": "x" * 300}, "secret", "HS256").decode("utf-8")
+        with self.assertNumQueries(0), self.assertRaises(NotFound):
+            run(jwt_devices_adecode_handler(crafted))
+
+    @override_settings(JWT_DEVICES={"JWT_DEVICES_SECRET_STORE": LocalMemorySecretStore})
+    def test_decode_with_cached_secret(self):
+        run(jwt_devices_adecode_handler(self.token))
+        with self.assertNumQueries(0):
+            self.assertEqual(run(jwt_devices_adecode_handler(self.token))["device_id"], str(self.device.pk))
+
+    def test_authenticate(self):
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION="JWT {}".format(self.token))
+        user, token = run(PermanentTokenAuthentication().aauthenticate(request))
+        self.assertEqual((user, token), (self.user, self.token.encode()))
+
+        with self.assertNumQueries(1):  # the device secret only
+            user, token = run(StatelessPermanentTokenAuthentication().aauthenticate(request))
+        self.assertEqual(user.pk, self.user.pk)
+
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION="JWT {}x".format(self.token))
+        with self.assertRaises(AuthenticationFailed):
+            run(PermanentTokenAuthentication().aauthenticate(request))
+        self.assertIsNone(run(PermanentTokenAuthentication().aauthenticate(RequestFactory().get("/"))))
+
+
+class AsyncViewsTests(BaseTestCase):
+    def setUp(self):
+        super(AsyncViewsTests, self).setUp()
+        self.factory = RequestFactory()
+        self.device = Device.objects.create(user=self.user, name="Android")
+        self.token = jwt_devices_encode_handler(jwt_devices_payload_handler(self.user, device=self.device))
+
+    def test_refresh_token(self):
+        with freeze_time("2016-01-01 00:00:00") as frozen_time:
+            self.device.save()
+            frozen_time.tick(delta=timedelta(days=2))
+            response = run(adevice_refresh_token(self.factory.post("/")))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(json.loads(response.content.decode()), {"HTTP_PERMANENT_TOKEN": ["This field is required."]})
+
+            response = run(adevice_refresh_token(self.factory.post("/", HTTP_PERMANENT_TOKEN="123")))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+            request = self.factory.post("/", HTTP_PERMANENT_TOKEN=self.device.permanent_token)
+            response = run(adevice_refresh_token(request))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            token = json.loads(response.content.decode())["token"]
+            self.assertEqual(jwt_devices_decode_handler(token)["device_id"], str(self.device.pk))
+            self.assertEqual(Device.objects.get(pk=self.device.pk).last_request_datetime, frozen_time())
+            # the same response as the sync view
+            self.assertEqual(device_refresh_token(request).data, {"token": token})
+
+            frozen_time.tick(delta=timedelta(days=8))
+            response = run(adevice_refresh_token(request))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertFalse(Device.objects.exists())
+
+        response = run(adevice_refresh_token(self.factory.get("/")))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_logout(self):
+        other_device = Device.objects.create(user=self.user, name="Nokia")
+        request = self.factory.delete("/", HTTP_DEVICE_ID=str(other_device.pk))
+        response = run(adevice_logout(request))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response["WWW-Authenticate"], 'JWT realm="api"')
+
+        request = self.factory.delete("/", HTTP_AUTHORIZATION="JWT {}".format(self.token))
+        self.assertEqual(run(adevice_logout(request)).status_code, status.HTTP_400_BAD_REQUEST)
+
+        request.META["HTTP_DEVICE_ID"] = str(other_device.pk)
+        self.assertEqual(run(adevice_logout(request)).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(run(adevice_logout(request)).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(list(Device.objects.all()), [self.device])
+
+
+class AsyncMiddlewareTests(BaseTestCase):
+    def test_async_middleware(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = PermittedHeadersMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware.process_view))
+        request = RequestFactory().get("/", HTTP_PERMANENT_TOKEN="123")
+        self.assertEqual(run(middleware(request)).status_code, status.HTTP_200_OK)
+
+        response = run(middleware.process_view(request, device_logout, (), {}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sync_middleware(self):
+        middleware = PermittedHeadersMiddleware(lambda request: HttpResponse(status=201))
+        self.assertEqual(middleware(RequestFactory().get("/")).status_code, 201)
+        self.assertFalse(asyncio.iscoroutinefunction(middleware.process_view))
@@ -0,0 +1,53 @@
+from rest_framework import exceptions
+from rest_framework.test import APIRequestFactory
+from tests.test_utils import BaseTestCase
+
+from jwt_devices import views
+from jwt_devices.authentication import StatelessPermanentTokenAuthentication
+from jwt_devices.models import Device
+from jwt_devices.stores import LocalMemorySecretStore
+from jwt_devices.users import TokenUser
+from jwt_devices.utils import jwt_devices_encode_handler, jwt_devices_payload_handler
+
+
+class StatelessPermanentTokenAuthenticationTests(BaseTestCase):
+    jwt_devices_settings = {"JWT_DEVICES_SECRET_STORE": LocalMemorySecretStore}
+
+    def setUp(self):
+        super(StatelessPermanentTokenAuthenticationTests, self).setUp()
+        self.device = Device.objects.create(user=self.user, name="Android")
+        self.factory = APIRequestFactory()
+
+    def _get_request(self, user=None):
+        payload = jwt_devices_payload_handler(user or self.user, device=self.device)
+        token = jwt_devices_encode_handler(payload, device=self.device)
+        return self.factory.get("/devices/", HTTP_AUTHORIZATION="JWT {}".format(token))
+
+    def test_authenticate_without_queries(self):
+        authentication = StatelessPermanentTokenAuthentication()
+        authentication.authenticate(self._get_request())  # loads the device secret into the secret store
+
+        with self.assertNumQueries(0):
+            user, _ = authentication.authenticate(self._get_request())
+            self.assertIsInstance(user, TokenUser)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertEqual(user.username, self.username)
+            self.assertTrue(user.is_active)
+            self.assertTrue(user.is_authenticated)
+            self.assertEqual(user, self.user)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.email)
+            self.assertEqual(user.get_full_name(), self.user.get_full_name())
+
+    def test_inactive_user(self):
+        self.user.is_active = False
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            StatelessPermanentTokenAuthentication().authenticate(self._get_request())
+
+    def test_device_list(self):
+        view = views.DeviceViewSet.as_view(
+            {"get": "list"}, authentication_classes=[StatelessPermanentTokenAuthentication])
+        response = view(self._get_request())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([device["id"] for device in response.data], [self.device.id])
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase
+from freezegun import freeze_time
+
+from jwt_devices.cache import LRUCache
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_eviction(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)  # "b" becomes the least recently used entry
+        cache.set("c", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_ttl(self):
+        with freeze_time("2016-01-01 00:00:00") as frozen_time:
+            cache = LRUCache(max_size=2, ttl=60)
+            cache.set("a", 1)
+            frozen_time.tick(delta=timedelta(seconds=59))
+            self.assertEqual(cache.get("a"), 1)
+            frozen_time.tick(delta=timedelta(seconds=2))
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(len(cache), 0)
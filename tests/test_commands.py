@@ -0,0 +1,31 @@
+from io import StringIO
+
+from django.core.management import call_command
+from freezegun import freeze_time
+from tests.test_utils import BaseTestCase
+
+from jwt_devices.models import Device
+
+
+class PurgeExpiredDevicesTests(BaseTestCase):
+    def setUp(self):
+        super(PurgeExpiredDevicesTests, self).setUp()
+        with freeze_time("2016-01-01 00:00:00"):
+            self.expired = [Device.objects.create(user=self.user, name="Android") for _ in range(5)]
+        with freeze_time("2016-01-07 00:00:00"):
+            self.active = Device.objects.create(user=self.user, name="Nokia")
+
+    def test_dry_run(self):
+        with freeze_time("2016-01-09 00:00:00"):
+            out = StringIO()
+            call_command("purge_expired_devices", "--dry-run", stdout=out)
+        self.assertIn("5 expired devices would be deleted.", out.getvalue())
+        self.assertEqual(Device.objects.count(), 6)
+
+    def test_purge_in_chunks(self):
+        with freeze_time("2016-01-09 00:00:00"):
+            out = StringIO()
+            call_command("purge_expired_devices", "--chunk-size", "2", stdout=out, verbosity=2)
+        self.assertIn("Deleted 2 expired devices so far.", out.getvalue())
+        self.assertIn("Deleted 5 expired devices.", out.getvalue())
+        self.assertEqual(list(Device.objects.all()), [self.active])
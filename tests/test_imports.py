@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.test import SimpleTestCase
+
+# modules only needed to serve the API views
+VIEW_MODULES = {
+    "jwt_devices.views",
+    "jwt_devices.serializers",
+    "rest_framework.generics",
+    "rest_framework.viewsets",
+    "rest_framework_jwt.views",
+}
+
+SCRIPT = """
+import json, sys
+from benchmarks import setup_django
+setup_django()
+before = set(sys.modules)
+import {module}
+{code}
+print(json.dumps(sorted(set(sys.modules) - before)))
+"""
+
+
+def get_imported_modules(module, code=""):
+    """
+    Imports `module` and runs `code` in a new interpreter and returns the modules imported after Django was set up.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(module=module, code=code)],
+        cwd=root, stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    return set(json.loads(output.splitlines()[-1]))
+
+
+class ImportTests(SimpleTestCase):
+    def assertNotImported(self, imports, modules):
+        imported = imports & modules
+        self.assertFalse(imported, "unexpected imports: {}".format(", ".join(sorted(imported))))
+
+    def test_decode_imports(self):
+        imports = get_imported_modules("jwt_devices.utils", "from jwt_devices.settings import get_compiled_settings\n"
+                                                            "get_compiled_settings()")
+        self.assertIn("jwt_devices.utils", imports)
+        self.assertNotImported(imports, VIEW_MODULES | {"rest_framework.serializers", "asyncio"})
+
+    def test_authentication_imports(self):
+        imports = get_imported_modules("jwt_devices.authentication")
+        self.assertIn("jwt_devices.authentication", imports)
+        self.assertNotImported(imports, VIEW_MODULES)
+
+    def test_middleware_imports(self):
+        imports = get_imported_modules("jwt_devices.middleware")
+        self.assertIn("jwt_devices.middleware", imports)
+        self.assertNotImported(imports, VIEW_MODULES | {"rest_framework.serializers"})
@@ -0,0 +1,149 @@
+import datetime
+import subprocess
+import sys
+import unittest
+
+import jwt
+from django.test import override_settings
+from tests.test_utils import BaseTestCase
+
+from jwt_devices.models import Device
+from jwt_devices.utils import jwt_devices_encode_handler, jwt_devices_payload_handler
+
+try:
+    import cryptography
+except ImportError:
+    cryptography = None
+
+if cryptography is not None:
+    from jwt_devices.jwk import jwk_to_public_key, public_key_to_jwk
+    from jwt_devices.keys import generate_private_key, get_key_id, get_private_key_pem, get_public_key_pem
+    from jwt_devices.verifier import JWKSVerifier
+
+    PRIVATE_KEY = generate_private_key("ES256")
+    OLD_PRIVATE_KEY = generate_private_key("ES256")
+    KEY_ID = get_key_id(PRIVATE_KEY.public_key())
+    OLD_KEY_ID = get_key_id(OLD_PRIVATE_KEY.public_key())
+
+    class ClientVerifier(JWKSVerifier):
+        """
+        Verifier fetching the keys with the Django test client.
+        """
+
+        def __init__(self, client, **kwargs):
+            super(ClientVerifier, self).__init__("/jwks/", **kwargs)
+            self.client = client
+            self.statuses = []
+
+        def fetch(self, etag=None):
+            response = self.client.get(self.url, **({"HTTP_IF_NONE_MATCH": etag} if etag else {}))
+            self.statuses.append(response.status_code)
+            if response.status_code >= 400:
+                raise OSError("HTTP Error {}".format(response.status_code))
+            return response.status_code, {k.lower(): v for k, v in response.items()}, response.content
+
+
+def asymmetric_settings(private_key=None, **kwargs):
+    return override_settings(JWT_DEVICES=dict({
+        "JWT_DEVICES_ALGORITHM": "ES256",
+        "JWT_DEVICES_PRIVATE_KEY": get_private_key_pem(private_key or PRIVATE_KEY),
+    }, **kwargs))
+
+
+@unittest.skipIf(cryptography is None, "cryptography is not installed")
+class JSONWebKeySetViewTests(BaseTestCase):
+    def test_symmetric_mode(self):
+        response = self.client.get("/jwks/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_key_set(self):
+        old_public_key = get_public_key_pem(OLD_PRIVATE_KEY.public_key())
+        with asymmetric_settings(JWT_DEVICES_PUBLIC_KEYS={OLD_KEY_ID: old_public_key}):
+            response = self.client.get("/jwks/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([key["kid"] for key in response.data["keys"]], [KEY_ID, OLD_KEY_ID])
+            self.assertEqual(response.data["keys"][0]["alg"], "ES256")
+            self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+
+            response = self.client.get("/jwks/", HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b"")
+
+        with asymmetric_settings():
+            self.assertEqual(self.client.get("/jwks/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_jwk_round_trip(self):
+        for algorithm in ("RS256", "ES256", "ES384", "ES512"):
+            public_key = generate_private_key(algorithm).public_key()
+            jwk = public_key_to_jwk(public_key, "kid", algorithm)
+            self.assertEqual(get_public_key_pem(jwk_to_public_key(jwk)), get_public_key_pem(public_key))
+
+        with self.assertRaises(ValueError):
+            jwk_to_public_key({"kty": "oct", "k": "c2VjcmV0"})
+
+
+@unittest.skipIf(cryptography is None, "cryptography is not installed")
+class JWKSVerifierTests(BaseTestCase):
+    def setUp(self):
+        super(JWKSVerifierTests, self).setUp()
+        self.device = Device.objects.create(user=self.user, name="Android")
+        self.payload = jwt_devices_payload_handler(self.user, device=self.device)
+
+    def test_verify(self):
+        verifier = ClientVerifier(self.client)
+        with asymmetric_settings():
+            token = jwt_devices_encode_handler(self.payload)
+            self.assertEqual(verifier.verify(token)["device_id"], str(self.device.pk))
+            with self.assertNumQueries(0):
+                self.assertEqual(verifier.verify(token)["device_id"], str(self.device.pk))
+
+            with self.assertRaises(jwt.DecodeError):
+                verifier.verify(token[:-4])
+            with self.assertRaises(jwt.InvalidAlgorithmError):
+                verifier.verify(jwt.encode(self.payload, "secret", "HS256", headers={"kid": KEY_ID}))
+            with self.assertRaises(jwt.InvalidTokenError):
+                verifier.verify(jwt.encode(dict(self.payload, is_active=False), PRIVATE_KEY, "ES256",
+                                           headers={"kid": KEY_ID}))
+        self.assertEqual(verifier.statuses, [200])
+
+    def test_key_rotation(self):
+        verifier = ClientVerifier(self.client, min_refresh_interval=0)
+        with asymmetric_settings(OLD_PRIVATE_KEY):
+            verifier.verify(jwt_devices_encode_handler(self.payload))
+
+        # a token signed with an unknown key fetches the key set again
+        with asymmetric_settings():
+            token = jwt_devices_encode_handler(self.payload)
+            self.assertEqual(verifier.verify(token)["device_id"], str(self.device.pk))
+        self.assertEqual(verifier.statuses, [200, 200])
+
+        # but at most once per min_refresh_interval
+        verifier.min_refresh_interval = 60
+        with self.assertRaises(jwt.InvalidTokenError):
+            verifier.verify(jwt.encode(self.payload, PRIVATE_KEY, "ES256", headers={"kid": "unknown"}))
+        self.assertEqual(verifier.statuses, [200, 200])
+
+    def test_revalidate_expired_key_set(self):
+        verifier = ClientVerifier(self.client)
+        with asymmetric_settings(JWT_DEVICES_JWKS_MAX_AGE=datetime.timedelta(0)):
+            token = jwt_devices_encode_handler(self.payload)
+            verifier.verify(token)
+            verifier.verify(token)
+        self.assertEqual(verifier.statuses, [200, 304])
+
+    def test_keep_keys_when_fetching_fails(self):
+        verifier = ClientVerifier(self.client, max_age=0)
+        with asymmetric_settings(JWT_DEVICES_JWKS_MAX_AGE=datetime.timedelta(0)):
+            token = jwt_devices_encode_handler(self.payload)
+            verifier.verify(token)
+
+        verifier.url = "/unavailable/"
+        with self.assertLogs("jwt_devices.verifier", "WARNING"):
+            self.assertEqual(verifier.verify(token)["device_id"], str(self.device.pk))
+
+        with self.assertRaises(OSError):
+            ClientVerifier(self.client).verify(token)
+
+    def test_no_django_imports(self):
+        code = "import sys, jwt_devices.verifier; sys.exit('django' in sys.modules)"
+        self.assertEqual(subprocess.run([sys.executable, "-c", code]).returncode, 0)
@@ -0,0 +1,130 @@
+import json
+import unittest
+from io import StringIO
+
+import jwt
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from jwt.utils import base64url_encode
+from rest_framework.exceptions import NotFound
+from tests.test_utils import BaseTestCase
+
+from jwt_devices.models import Device
+from jwt_devices.settings import get_compiled_settings
+from jwt_devices.utils import (get_token_device_id, jwt_devices_decode_handler, jwt_devices_encode_handler,
+                               jwt_devices_payload_handler)
+
+try:
+    import cryptography
+except ImportError:
+    cryptography = None
+
+if cryptography is not None:
+    from jwt_devices.keys import (generate_private_key, get_key_id, get_private_key_pem, get_public_key_pem,
+                                  load_private_key)
+
+    PRIVATE_KEY = generate_private_key("ES256")
+    OLD_PRIVATE_KEY = generate_private_key("ES256")
+    PRIVATE_KEY_PEM = get_private_key_pem(PRIVATE_KEY)
+    OLD_PRIVATE_KEY_PEM = get_private_key_pem(OLD_PRIVATE_KEY)
+    KEY_ID = get_key_id(PRIVATE_KEY.public_key())
+    OLD_KEY_ID = get_key_id(OLD_PRIVATE_KEY.public_key())
+
+
+@unittest.skipIf(cryptography is None, "cryptography is not installed")
+class AsymmetricSigningTests(BaseTestCase):
+    def setUp(self):
+        super(AsymmetricSigningTests, self).setUp()
+        self.device = Device.objects.create(user=self.user, name="Android")
+        self.payload = jwt_devices_payload_handler(self.user, device=self.device)
+
+    def asymmetric_settings(self, **kwargs):
+        return override_settings(JWT_DEVICES=dict({
+            "JWT_DEVICES_ALGORITHM": "ES256",
+            "JWT_DEVICES_PRIVATE_KEY": PRIVATE_KEY_PEM,
+        }, **kwargs))
+
+    def test_sign_with_private_key(self):
+        with self.asymmetric_settings():
+            with self.assertNumQueries(0):
+                token = jwt_devices_encode_handler(self.payload)
+            self.assertEqual(get_token_device_id(token), str(self.device.pk))
+
+            # the tokens are verified with the public key only, so they stay valid until they expire
+            self.device.delete()
+            with self.assertNumQueries(0):
+                payload = jwt_devices_decode_handler(token)
+
+        self.assertEqual(jwt.get_unverified_header(token)["kid"], KEY_ID)
+        self.assertEqual(payload, jwt.decode(token, get_public_key_pem(PRIVATE_KEY.public_key()), algorithms=["ES256"]))
+
+    def test_device_secret_tokens_still_accepted(self):
+        legacy_token = jwt_devices_encode_handler(self.payload)
+        with self.asymmetric_settings():
+            self.assertEqual(jwt_devices_decode_handler(legacy_token)["device_id"], str(self.device.pk))
+
+    def test_invalid_tokens(self):
+        with self.asymmetric_settings():
+            # the key id does not let a token signed with another algorithm be verified with the public key
+            confused = jwt.encode(self.payload, "secret", "HS256", headers={"kid": KEY_ID}).decode("utf-8")
+            with self.assertRaises(jwt.InvalidAlgorithmError):
+                jwt_devices_decode_handler(confused)
+
+            # neither can an unknown key be used in place of the device secret
+            forged = jwt.encode(self.payload, OLD_PRIVATE_KEY_PEM, "ES256").decode("utf-8")
+            with self.assertRaises(jwt.InvalidAlgorithmError):
+                jwt_devices_decode_handler(forged)
+
+            forged = jwt.encode(self.payload, OLD_PRIVATE_KEY_PEM, "ES256", headers={"kid": KEY_ID}).decode("utf-8")
+            with self.assertRaises(jwt.DecodeError):
+                jwt_devices_decode_handler(forged)
+
+            # a key id which is not a string is neither a server key nor a device
+            header = base64url_encode(json.dumps({"alg": "ES256", "kid": [KEY_ID]}).encode("utf-8"))
+            forged = b".".join([header] + forged.encode("utf-8").split(b".")[1:]).decode("utf-8")
+            with self.assertRaises(NotFound):
+                jwt_devices_decode_handler(forged)
+
+    def test_key_rotation(self):
+        with self.asymmetric_settings(JWT_DEVICES_PRIVATE_KEY=OLD_PRIVATE_KEY_PEM):
+            old_token = jwt_devices_encode_handler(self.payload)
+
+        with self.asymmetric_settings(
+                JWT_DEVICES_PUBLIC_KEYS={OLD_KEY_ID: get_public_key_pem(OLD_PRIVATE_KEY.public_key())}):
+            self.assertEqual(jwt.get_unverified_header(jwt_devices_encode_handler(self.payload))["kid"], KEY_ID)
+            self.assertEqual(jwt_devices_decode_handler(old_token)["device_id"], str(self.device.pk))
+
+        with self.asymmetric_settings():
+            with self.assertRaises(NotFound):
+                jwt_devices_decode_handler(old_token)
+
+    def test_key_id(self):
+        with self.asymmetric_settings(JWT_DEVICES_KEY_ID="2024-01"):
+            token = jwt_devices_encode_handler(self.payload)
+            self.assertEqual(jwt.get_unverified_header(token)["kid"], "2024-01")
+            self.assertEqual(jwt_devices_decode_handler(token)["device_id"], str(self.device.pk))
+
+    def test_login(self):
+        with self.asymmetric_settings():
+            response = self.client.post("/auth-token/", self.data, format="json")
+            token = response.data["token"]
+            self.assertEqual(jwt.get_unverified_header(token)["kid"], KEY_ID)
+            response = self.client.get("/devices/", HTTP_AUTHORIZATION="JWT {}".format(token))
+            self.assertEqual(response.status_code, 200)
+
+    def test_improperly_configured(self):
+        with override_settings(JWT_DEVICES={"JWT_DEVICES_ALGORITHM": "HS256", "JWT_DEVICES_PRIVATE_KEY": "secret"}):
+            with self.assertRaises(ImproperlyConfigured):
+                get_compiled_settings()
+        with override_settings(JWT_DEVICES={"JWT_DEVICES_ALGORITHM": "ES256"}):
+            with self.assertRaises(ImproperlyConfigured):
+                get_compiled_settings()
+
+    def test_generate_signing_key(self):
+        out = StringIO()
+        call_command("generate_signing_key", "--algorithm", "RS256", stdout=out)
+        key_id_line, pem = out.getvalue().split("\n", 1)
+        private_key = load_private_key(pem)
+        self.assertEqual(key_id_line, "# key id: {}".format(get_key_id(private_key.public_key())))
+        self.assertEqual(private_key.key_size, 2048)
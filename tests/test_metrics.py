@@ -0,0 +1,64 @@
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from tests.test_utils import BaseTestCase, User
+
+from jwt_devices.metrics import BaseMetricsBackend, LoggingMetricsBackend, get_metrics_backend, timed
+from jwt_devices.models import Device
+
+
+class RecordingMetricsBackend(BaseMetricsBackend):
+    def __init__(self):
+        self.records = []
+
+    def record(self, name, duration, queries=None):
+        self.records.append((name, duration, queries))
+
+
+class MetricsTests(BaseTestCase):
+    def test_disabled(self):
+        self.assertIsNone(get_metrics_backend())
+        self.assertIs(timed("decode"), timed("refresh"))
+
+    @override_settings(JWT_DEVICES={"JWT_DEVICES_METRICS_BACKEND": RecordingMetricsBackend})
+    def test_instrumented_steps(self):
+        backend = get_metrics_backend()
+        client = APIClient()
+        response = client.post("/auth-token/", self.data, format="json")
+        client.credentials(HTTP_AUTHORIZATION="JWT {}".format(response.data["token"]))
+        self.assertEqual(client.get("/devices/").status_code, status.HTTP_200_OK)
+        client.credentials(HTTP_PERMANENT_TOKEN=response.data["permanent_token"])
+        self.assertEqual(client.post("/device-refresh-token/").status_code, status.HTTP_200_OK)
+
+        self.assertEqual(
+            [name for name, duration, queries in backend.records],
+            ["device_creation", "secret_lookup", "decode", "user_load", "refresh"])
+        self.assertTrue(all(duration >= 0 for name, duration, queries in backend.records))
+        # the device INSERT within a savepoint, then one query per step (decoding includes the secret lookup)
+        self.assertEqual([queries for name, duration, queries in backend.records], [3, 1, 1, 1, 1])
+
+    @override_settings(JWT_DEVICES={"JWT_DEVICES_METRICS_BACKEND": RecordingMetricsBackend})
+    def test_query_count(self):
+        backend = get_metrics_backend()
+        with timed("user_load"):
+            list(User.objects.all())
+            with timed("secret_lookup"):
+                Device.objects.count()
+        with timed("decode"):
+            pass
+        self.assertEqual([(name, queries) for name, duration, queries in backend.records],
+                         [("secret_lookup", 1), ("user_load", 2), ("decode", 0)])
+
+        backend.count_queries = False
+        with timed("decode"):
+            list(User.objects.all())
+        self.assertIsNone(backend.records[-1][2])
+
+    @override_settings(JWT_DEVICES={"JWT_DEVICES_METRICS_BACKEND": LoggingMetricsBackend})
+    def test_logging_backend(self):
+        with self.assertLogs("jwt_devices.metrics") as logs:
+            with timed("decode"):
+                pass
+        self.assertEqual(logs.records[0].metric, "decode")
+        self.assertGreaterEqual(logs.records[0].duration, 0)
+        self.assertTrue(logs.output[0].startswith("INFO:jwt_devices.metrics:decode took "))
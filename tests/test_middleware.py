@@ -1,7 +1,16 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 from tests.test_utils import BaseTestCase
 
+from jwt_devices import views
+from jwt_devices.middleware import PermittedHeadersCallMiddleware, PermittedHeadersMiddleware
+from jwt_devices.settings import get_permanent_token_views
+
+# the view re-exported from another module
+DeviceViewSet = views.DeviceViewSet
+
 
 class HeadersCheckViewMixinTests(BaseTestCase):
     def test_disallowing_permanent_token(self):
@@ -10,6 +19,7 @@ class HeadersCheckViewMixinTests(BaseTestCase):
         urls = {
             "/auth-token/",
             "/device-logout/",
+            "/device-bulk-logout/",
             "/devices/",
             "/devices/1/"
         }
@@ -24,3 +34,39 @@ class HeadersCheckViewMixinTests(BaseTestCase):
         for url in allowed_urls:
             response = client.get(url, format="json")
             self.assertNotEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_allowed_views_setting(self):
+        middleware = PermittedHeadersMiddleware()
+        request = RequestFactory().get("/devices/", HTTP_PERMANENT_TOKEN="123")
+        device_list = views.DeviceViewSet.as_view({"get": "list"})
+        allowed_views = ["jwt_devices.views.DeviceRefreshJSONWebToken", "tests.test_middleware.DeviceViewSet"]
+        with override_settings(JWT_DEVICES={"JWT_DEVICES_PERMANENT_TOKEN_VIEWS": allowed_views}):
+            self.assertIsNone(middleware.process_view(request, device_list, (), {}))
+            response = middleware.process_view(request, views.device_logout, (), {})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIs(get_permanent_token_views(), get_permanent_token_views())
+
+        response = middleware.process_view(request, device_list, (), {})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # the header is checked before the view
+        self.assertIsNone(middleware.process_view(RequestFactory().get("/"), views.device_logout, (), {}))
+        request = RequestFactory().get("/", HTTP_PERMANENT_TOKEN="")
+        self.assertIsNone(middleware.process_view(request, views.device_logout, (), {}))
+
+
+class PermittedHeadersCallMiddlewareTests(BaseTestCase):
+    def setUp(self):
+        super(PermittedHeadersCallMiddlewareTests, self).setUp()
+        self.middleware = PermittedHeadersCallMiddleware(lambda request: HttpResponse())
+
+    def test_disallowing_permanent_token(self):
+        for url in ["/auth-token/", "/device-logout/", "/devices/", "/devices/1/"]:
+            response = self.middleware(RequestFactory().get(url, HTTP_PERMANENT_TOKEN="123"))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(self.middleware(RequestFactory().get(url)).status_code, status.HTTP_200_OK)
+            response = self.middleware(RequestFactory().get(url, HTTP_PERMANENT_TOKEN=""))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for url in ["/device-refresh-token/", "/unknown/"]:
+            response = self.middleware(RequestFactory().get(url, HTTP_PERMANENT_TOKEN="123"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
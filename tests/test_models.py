@@ -0,0 +1,38 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.db import connection
+from django.test import override_settings
+from tests.test_utils import BaseTestCase
+
+from jwt_devices.models import Device
+
+
+class DeviceTests(BaseTestCase):
+    def test_permanent_token_digest(self):
+        device = Device.objects.create(user=self.user, name="Android")
+        self.assertEqual(len(device.permanent_token), 40)
+        self.assertEqual(len(device.permanent_token_digest), 64)
+        self.assertEqual(Device.objects.get(permanent_token_digest=Device.hash_token(device.permanent_token)), device)
+        self.assertEqual(Device.objects.get(pk=device.pk).permanent_token, device.permanent_token)
+
+    def test_hashed_permanent_token(self):
+        with override_settings(JWT_DEVICES={"JWT_DEVICES_HASH_PERMANENT_TOKENS": True}):
+            device = Device.objects.create(user=self.user, name="Android")
+
+        # the plaintext token is kept on the instance only
+        self.assertEqual(len(device.permanent_token), 40)
+        stored = Device.objects.get(permanent_token_digest=Device.hash_token(device.permanent_token))
+        self.assertIsNone(stored.permanent_token)
+        stored.save()
+        self.assertEqual(Device.objects.get(pk=device.pk).permanent_token_digest, device.permanent_token_digest)
+
+    def test_populate_permanent_token_digest_migration(self):
+        migration = import_module("jwt_devices.migrations.0005_populate_permanent_token_digest")
+        devices = [Device.objects.create(user=self.user, name="Android") for _ in range(3)]
+        Device.objects.update(permanent_token_digest=None)
+
+        with connection.schema_editor() as schema_editor:
+            migration.populate_permanent_token_digest(apps, schema_editor)
+        for device in devices:
+            self.assertEqual(Device.objects.get(pk=device.pk).permanent_token_digest, device.permanent_token_digest)
@@ -0,0 +1,137 @@
+import asyncio
+import uuid
+from unittest import mock
+
+import jwt
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APIClient
+from tests.test_utils import BaseTestCase
+
+from jwt_devices.models import Device
+from jwt_devices.revocation import BloomFilter, CacheRevocationList, get_revocation_list, revoke_tokens
+from jwt_devices.stores import DatabaseSecretStore
+from jwt_devices.utils import (delete_devices, jwt_devices_adecode_handler, jwt_devices_decode_handler,
+                               jwt_devices_encode_handler, jwt_devices_payload_handler)
+
+
+class BloomFilterTests(BaseTestCase):
+    def test_membership(self):
+        bloom = BloomFilter(1000, 0.01)
+        values = [uuid.uuid4().hex for _ in range(1000)]
+        for value in values:
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class CacheRevocationListTests(BaseTestCase):
+    jwt_devices_settings = {"JWT_DEVICES_REVOCATION_LIST": CacheRevocationList}
+
+    def setUp(self):
+        super(CacheRevocationListTests, self).setUp()
+        cache.clear()
+        self.device = Device.objects.create(user=self.user, name="Android")
+        self.token = jwt_devices_encode_handler(jwt_devices_payload_handler(self.user, device=self.device))
+
+    def test_delete_device(self):
+        other_device = Device.objects.create(user=self.user, name="Nokia")
+        other_token = jwt_devices_encode_handler(jwt_devices_payload_handler(self.user, device=other_device))
+        self.assertEqual(jwt_devices_decode_handler(self.token)["device_id"], str(self.device.pk))
+
+        self.device.delete()
+        secret = self.device.jwt_secret.hex
+
+        async def aget_secret(store, device_id):
+            return secret
+
+        # the cached secret stores would still accept the token until the secret expires
+        with mock.patch("jwt_devices.utils._get_device_secret", return_value=secret), \
+                mock.patch.object(DatabaseSecretStore, "aget_secret", aget_secret):
+            with self.assertRaises(jwt.InvalidTokenError):
+                jwt_devices_decode_handler(self.token)
+            with self.assertRaises(jwt.InvalidTokenError):
+                asyncio.get_event_loop().run_until_complete(jwt_devices_adecode_handler(self.token))
+        jwt_devices_decode_handler(other_token)
+
+        response = APIClient().get("/devices/", HTTP_AUTHORIZATION="JWT {}".format(other_token))
+        self.assertEqual(response.status_code, 200)
+
+    def test_revoke_token(self):
+        other_token = jwt_devices_encode_handler(jwt_devices_payload_handler(self.user, device=self.device))
+        revoke_tokens([jwt.decode(self.token, verify=False)["jti"]])
+
+        with self.assertRaises(jwt.InvalidTokenError):
+            jwt_devices_decode_handler(self.token)
+        self.assertEqual(jwt_devices_decode_handler(other_token)["device_id"], str(self.device.pk))
+
+        response = APIClient().get("/devices/", HTTP_AUTHORIZATION="JWT {}".format(self.token))
+        self.assertEqual(response.status_code, 401)
+
+    def test_tokens_not_revoked_checked_in_memory(self):
+        revocation_list = get_revocation_list()
+        revocation_list.sync()
+        with mock.patch.object(revocation_list, "sync") as sync, \
+                mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            for _ in range(10):
+                self.assertFalse(revocation_list.is_revoked(self.device.pk, uuid.uuid4().hex))
+        sync.assert_not_called()
+        get_many.assert_not_called()
+
+    def test_sync_other_processes(self):
+        other_process = CacheRevocationList()
+        self.assertFalse(other_process.is_revoked(self.device.pk))
+
+        get_revocation_list().revoke(["device:{}".format(self.device.pk)])
+        # the revocation is seen on the next sync
+        self.assertFalse(other_process.is_revoked(self.device.pk))
+        other_process._next_sync = 0
+        self.assertTrue(other_process.is_revoked(self.device.pk))
+
+        # a new process reads the revocations of the last periods
+        self.assertTrue(CacheRevocationList().is_revoked(self.device.pk))
+
+    def test_retry_missing_revocations(self):
+        other_process = CacheRevocationList()
+        other_process.sync()
+        # the sequence number is taken, but the revoked id is not stored yet
+        cache.add(other_process.get_cache_key("sequence"), 0, timeout=None)
+        sequence = cache.incr(other_process.get_cache_key("sequence"))
+        other_process.sync()
+        self.assertEqual(other_process._retry, [sequence])
+
+        value = "device:{}".format(self.device.pk)
+        cache.set(other_process.get_cache_key("revoked", value), True)
+        cache.set(other_process.get_cache_key("event", sequence), value)
+        other_process.sync()
+        self.assertTrue(other_process.is_revoked(self.device.pk))
+        self.assertEqual(other_process._retry, [])
+
+    def test_rebuild_after_cache_clear(self):
+        revocation_list = get_revocation_list()
+        value = "device:{}".format(self.device.pk)
+        self.device.delete()
+        revocation_list.sync()
+        self.assertIn(value, revocation_list._bloom)
+
+        cache.clear()
+        Device.objects.create(user=self.user, name="Nokia").delete()
+        revocation_list.sync()
+        self.assertNotIn(value, revocation_list._bloom)
+        self.assertEqual(revocation_list._bloom.count, 1)
+
+    def test_bulk_delete(self):
+        devices = [Device.objects.create(user=self.user, name="Android {}".format(index)) for index in range(3)]
+        with mock.patch.object(cache, "incr", wraps=cache.incr) as incr:
+            delete_devices(Device.objects.filter(pk__in=[device.pk for device in devices]))
+        incr.assert_called_once_with(get_revocation_list().get_cache_key("sequence"), 3)
+        self.assertTrue(all(get_revocation_list().is_revoked(device.pk) for device in devices))
+
+    def test_disabled(self):
+        with override_settings(JWT_DEVICES={}):
+            self.assertIsNone(get_revocation_list())
+            self.assertNotIn("jti", jwt_devices_payload_handler(self.user, device=self.device))
+            self.device.delete()
+        self.assertEqual(cache.get("jwt_devices:revocation:sequence"), None)
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from tests.test_utils import BaseTestCase
+
+from jwt_devices.settings import api_settings, get_compiled_settings
+from jwt_devices.stores import DatabaseSecretStore, LocalMemorySecretStore, get_secret_store
+from jwt_devices.utils import jwt_devices_response_payload_handler
+
+
+def custom_response_payload_handler(token, user=None, request=None, **kwargs):
+    data = jwt_devices_response_payload_handler(token, user, request, **kwargs)
+    data["custom"] = True
+    return data
+
+
+class CompiledSettingsTests(SimpleTestCase):
+    def test_snapshot(self):
+        config = get_compiled_settings()
+        self.assertIs(get_compiled_settings(), config)
+        self.assertTrue(config.permanent_token_auth)
+        self.assertEqual(config.secret_cache_ttl, 60.0)
+        with self.assertRaises(AttributeError):
+            config.permanent_token_auth = False
+
+    def test_unknown_eviction_policy(self):
+        with override_settings(JWT_DEVICES={"JWT_DEVICES_EVICTION_POLICY": "random"}):
+            with self.assertRaisesMessage(ImproperlyConfigured, "least_recently_used, oldest"):
+                get_compiled_settings()
+
+    def test_reload_on_setting_changed(self):
+        config = get_compiled_settings()
+        with override_settings(JWT_DEVICES={"JWT_DEVICES_SECRET_CACHE_TTL": timedelta(minutes=5)}):
+            self.assertEqual(get_compiled_settings().secret_cache_ttl, 300.0)
+            self.assertEqual(api_settings.JWT_DEVICES_SECRET_CACHE_TTL, timedelta(minutes=5))
+        self.assertEqual(get_compiled_settings(), config)
+        self.assertEqual(api_settings.JWT_DEVICES_SECRET_CACHE_TTL, timedelta(seconds=60))
+
+    def test_reset_process_wide_instances(self):
+        store = get_secret_store()
+        with override_settings(JWT_DEVICES={
+            "JWT_DEVICES_SECRET_STORE": LocalMemorySecretStore,
+            "JWT_DEVICES_SECRET_CACHE_TTL": timedelta(minutes=5),
+        }):
+            local_store = get_secret_store()
+            self.assertEqual(local_store.local_ttl, 300.0)
+            with override_settings(JWT_DEVICES={"JWT_DEVICES_SECRET_STORE": LocalMemorySecretStore}):
+                # the same class, built again with the current TTL
+                self.assertIsNot(get_secret_store(), local_store)
+                self.assertEqual(get_secret_store().local_ttl, 60.0)
+        self.assertIsNot(get_secret_store(), store)
+        self.assertIsInstance(get_secret_store(), DatabaseSecretStore)
+
+    def test_rest_framework_fallback(self):
+        with override_settings(REST_FRAMEWORK={"JWT_DEVICES_KID_HEADER": True}):
+            with self.assertWarns(DeprecationWarning):
+                self.assertTrue(get_compiled_settings().kid_header)
+
+            # JWT_DEVICES takes precedence
+            with override_settings(JWT_DEVICES={"JWT_DEVICES_SECRET_CACHE_TTL": timedelta(minutes=5)}):
+                self.assertFalse(get_compiled_settings().kid_header)
+        self.assertFalse(get_compiled_settings().kid_header)
+
+
+class HandlerOverrideTests(BaseTestCase):
+    @override_settings(JWT_DEVICES={
+        "JWT_DEVICES_RESPONSE_PAYLOAD_HANDLER": "tests.test_settings.custom_response_payload_handler"
+    })
+    def test_response_payload_handler(self):
+        response = APIClient().post("/auth-token/", self.data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["custom"])
@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.core.cache import cache
+from rest_framework.exceptions import NotFound
+from tests.test_utils import BaseTestCase
+
+from jwt_devices.models import Device
+from jwt_devices.stores import (CacheSecretStore, DatabaseSecretStore, LocalMemorySecretStore, TieredSecretStore,
+                                get_secret_store)
+from jwt_devices.utils import jwt_devices_get_secret_key
+
+
+class SecretStoreTestMixin(object):
+    def setUp(self):
+        super(SecretStoreTestMixin, self).setUp()
+        cache.clear()
+        self.device = Device.objects.create(user=self.user, name="Android")
+        self.payload = {"device_id": str(self.device.pk)}
+
+    def test_secret_is_cached(self):
+        self.assertIsInstance(get_secret_store(), self.jwt_devices_settings["JWT_DEVICES_SECRET_STORE"])
+        with self.assertNumQueries(1):
+            self.assertEqual(jwt_devices_get_secret_key(self.payload), self.device.jwt_secret.hex)
+        with self.assertNumQueries(0):
+            self.assertEqual(jwt_devices_get_secret_key(self.payload), self.device.jwt_secret.hex)
+
+    def test_invalidation(self):
+        jwt_devices_get_secret_key(self.payload)
+        self.device.save()
+        with self.assertNumQueries(1):
+            jwt_devices_get_secret_key(self.payload)
+
+        self.device.delete()
+        with self.assertRaises(NotFound):
+            jwt_devices_get_secret_key(self.payload)
+
+    def test_invalidation_after_commit(self):
+        jwt_devices_get_secret_key(self.payload)
+        with mock.patch("jwt_devices.stores.transaction.on_commit") as on_commit:
+            self.device.delete()
+
+        # a lookup from another connection still reads the secret until the deletion is committed
+        with mock.patch.object(DatabaseSecretStore, "load_secret", return_value=self.device.jwt_secret.hex):
+            jwt_devices_get_secret_key(self.payload)
+        for args, kwargs in on_commit.call_args_list:
+            args[0]()
+        with self.assertRaises(NotFound):
+            jwt_devices_get_secret_key(self.payload)
+
+    def test_negative_caching(self):
+        payload = {"device_id": str(self.device.pk + 1)}
+        with self.assertNumQueries(1):
+            with self.assertRaises(NotFound):
+                jwt_devices_get_secret_key(payload)
+        with self.assertNumQueries(0):
+            with self.assertRaises(NotFound):
+                jwt_devices_get_secret_key(payload)
+
+
+class DatabaseSecretStoreTests(BaseTestCase):
+    def test_lookup(self):
+        device = Device.objects.create(user=self.user, name="Android")
+        store = DatabaseSecretStore()
+        with self.assertNumQueries(2):
+            self.assertEqual(store.get_secret(device.pk), device.jwt_secret.hex)
+            self.assertEqual(store.get_secret(device.pk), device.jwt_secret.hex)
+        self.assertIsNone(store.get_secret(device.pk + 1))
+        self.assertIsNone(store.get_secret("not a number"))
+
+
+class LocalMemorySecretStoreTests(SecretStoreTestMixin, BaseTestCase):
+    jwt_devices_settings = {"JWT_DEVICES_SECRET_STORE": LocalMemorySecretStore}
+
+
+class CacheSecretStoreTests(SecretStoreTestMixin, BaseTestCase):
+    jwt_devices_settings = {"JWT_DEVICES_SECRET_STORE": CacheSecretStore}
+
+    def test_shared_between_processes(self):
+        jwt_devices_get_secret_key(self.payload)
+        # a new store instance stands in for another process sharing the cache backend
+        with self.assertNumQueries(0):
+            self.assertEqual(CacheSecretStore().get_secret(self.device.pk), self.device.jwt_secret.hex)
+
+
+class TieredSecretStoreTests(SecretStoreTestMixin, BaseTestCase):
+    jwt_devices_settings = {"JWT_DEVICES_SECRET_STORE": TieredSecretStore}
+
+    def test_local_tier(self):
+        jwt_devices_get_secret_key(self.payload)
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(jwt_devices_get_secret_key(self.payload), self.device.jwt_secret.hex)
@@ -1,13 +1,29 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from unittest import mock
+
+import jwt
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import NotFound
 from rest_framework_jwt.compat import get_user_model
 
-from jwt_devices.settings import api_settings
+from jwt_devices.models import Device
+from jwt_devices.stores import DatabaseSecretStore
+from jwt_devices.utils import (handler_accepts_device, jwt_devices_decode_handler, jwt_devices_encode_handler,
+                               jwt_devices_payload_handler)
 
 User = get_user_model()
 
 
 class BaseTestCase(TestCase):
+    # the JWT_DEVICES setting of every test of the class, overridden per test to build new process wide instances
+    jwt_devices_settings = None
+
     def setUp(self):
+        if self.jwt_devices_settings is not None:
+            settings_override = override_settings(JWT_DEVICES=self.jwt_devices_settings)
+            settings_override.enable()
+            self.addCleanup(settings_override.disable)
+
         self.email = "jpueblo@example.com"
         self.username = "jpueblo"
         self.password = "password"
@@ -19,7 +35,78 @@ class BaseTestCase(TestCase):
             "password": self.password
         }
 
-        api_settings.JWT_PERMANENT_TOKEN_AUTH = True
 
-    def tearDown(self):
-        api_settings.JWT_PERMANENT_TOKEN_AUTH = False
+class EncodeHandlerTests(BaseTestCase):
+    def setUp(self):
+        super(EncodeHandlerTests, self).setUp()
+        self.device = Device.objects.create(user=self.user, name="Android")
+
+    def test_encode_with_device_in_hand(self):
+        payload = jwt_devices_payload_handler(self.user, device=self.device)
+        with self.assertNumQueries(0):
+            token = jwt_devices_encode_handler(payload, device=self.device)
+        self.assertEqual(token, jwt_devices_encode_handler(payload))
+        self.assertEqual(jwt_devices_decode_handler(token)["device_id"], str(self.device.pk))
+
+    def test_handler_accepts_device(self):
+        self.assertTrue(handler_accepts_device(jwt_devices_encode_handler))
+        self.assertTrue(handler_accepts_device(lambda payload, **kwargs: None))
+        self.assertFalse(handler_accepts_device(lambda payload: None))
+
+
+class DecodeHandlerTests(BaseTestCase):
+    def setUp(self):
+        super(DecodeHandlerTests, self).setUp()
+        self.device = Device.objects.create(user=self.user, name="Android")
+        self.payload = jwt_devices_payload_handler(self.user, device=self.device)
+
+    def test_decode(self):
+        token = jwt_devices_encode_handler(self.payload)
+        payload = jwt_devices_decode_handler(token)
+        self.assertEqual(payload, jwt.decode(token, self.device.jwt_secret.hex, algorithms=["HS256"]))
+
+    def test_invalid_tokens(self):
+        token = jwt_devices_encode_handler(self.payload)
+        with self.assertRaises(jwt.DecodeError):
+            jwt_devices_decode_handler(token[:-2])
+        with self.assertRaises(jwt.DecodeError):
+            jwt_devices_decode_handler("a.b")
+
+        forged = jwt.encode(self.payload, "not the device secret", "HS256").decode("utf-8")
+        with self.assertRaises(jwt.DecodeError):
+            jwt_devices_decode_handler(forged)
+
+        other_algorithm = jwt.encode(self.payload, self.device.jwt_secret.hex, "HS512").decode("utf-8")
+        with self.assertRaises(jwt.InvalidAlgorithmError):
+            jwt_devices_decode_handler(other_algorithm)
+
+        self.payload["exp"] = datetime.utcnow() - timedelta(seconds=1)
+        with self.assertRaises(jwt.ExpiredSignature):
+            jwt_devices_decode_handler(jwt_devices_encode_handler(self.payload))
+
+    def test_kid_header(self):
+        legacy_token = jwt_devices_encode_handler(self.payload)
+        with override_settings(JWT_DEVICES={"JWT_DEVICES_KID_HEADER": True}):
+            token = jwt_devices_encode_handler(self.payload)
+
+        self.assertEqual(jwt.get_unverified_header(token)["kid"], str(self.device.pk))
+        self.assertEqual(jwt_devices_decode_handler(token), self.payload)
+        # tokens issued without the kid header are still accepted
+        self.assertEqual(jwt_devices_decode_handler(legacy_token), self.payload)
+
+        other_device = Device.objects.create(user=self.user, name="Nokia")
+        mismatched = jwt.encode(
+            self.payload, other_device.jwt_secret.hex, "HS256", headers={"kid": str(other_device.pk)}).decode("utf-8")
+        with self.assertRaises(jwt.InvalidTokenError):
+            jwt_devices_decode_handler(mismatched)
+
+    def test_invalid_device_ids(self):
+        tokens = [jwt.encode(dict(self.payload, device_id=device_id), "secret", "HS256").decode("utf-8")
+                  for device_id in ["1 2", "1\x00", "\u00b2", "\u0661", "9" * 300, "-1", "0", -1, True, 1.5, [1], None]]
+        tokens.extend(jwt.encode(self.payload, "secret", "HS256", headers={"kid": kid}).decode("utf-8")
+                      for kid in ["x" * 300, "\u00b2"])
+        for token in tokens:
+            with mock.patch.object(DatabaseSecretStore, "get_secret") as get_secret:
+                with self.assertRaises(NotFound):
+                    jwt_devices_decode_handler(token)
+            get_secret.assert_not_called()
@@ -1,12 +1,16 @@
 from datetime import datetime, timedelta
 
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from freezegun import freeze_time
 from rest_framework import status
 from rest_framework.test import APIClient
 from tests.test_utils import BaseTestCase, User
 
 from jwt_devices.models import Device
-from jwt_devices.settings import api_settings
+from jwt_devices.pagination import DeviceCursorPagination
+from jwt_devices.stores import LocalMemorySecretStore
 
 
 class ObtainJSONWebTokenTests(BaseTestCase):
@@ -51,9 +55,66 @@ class ObtainJSONWebTokenTests(BaseTestCase):
         response = client.get("/devices/", format="json")
         self.assertEqual(response.status_code, 404)
 
+    def test_reusing_devices(self):
+        client = APIClient()
+        with override_settings(JWT_DEVICES={"JWT_DEVICES_REUSE_DEVICES": True}):
+            client.credentials(HTTP_X_DEVICE_MODEL="Nokia", HTTP_USER_AGENT="agent")
+            first = client.post("/auth-token/", self.data, format="json").data
+            device = Device.objects.get()
+
+            # the same device model and user agent
+            second = client.post("/auth-token/", self.data, format="json").data
+            self.assertEqual(second["device_id"], first["device_id"])
+            self.assertNotEqual(second["permanent_token"], first["permanent_token"])
+            self.assertNotEqual(Device.objects.get().jwt_secret, device.jwt_secret)
+
+            # the Device-Id header takes precedence over the device model and user agent
+            client.credentials(HTTP_X_DEVICE_MODEL="Android", HTTP_DEVICE_ID=str(first["device_id"]))
+            third = client.post("/auth-token/", self.data, format="json").data
+            self.assertEqual(third["device_id"], first["device_id"])
+            self.assertEqual(Device.objects.get().name, "Android")
+
+            # the credentials issued before are rotated
+            client.credentials(HTTP_AUTHORIZATION="JWT {}".format(second["token"]))
+            self.assertEqual(client.get("/devices/").status_code, status.HTTP_401_UNAUTHORIZED)
+            client.credentials(HTTP_PERMANENT_TOKEN=second["permanent_token"])
+            self.assertEqual(client.post("/device-refresh-token/").status_code, status.HTTP_400_BAD_REQUEST)
+            client.credentials(HTTP_AUTHORIZATION="JWT {}".format(third["token"]))
+            self.assertEqual(client.get("/devices/").status_code, status.HTTP_200_OK)
+            client.credentials(HTTP_PERMANENT_TOKEN=third["permanent_token"])
+            self.assertEqual(client.post("/device-refresh-token/").status_code, status.HTTP_200_OK)
+
+            # the device of another user is never reused
+            client.credentials(HTTP_X_DEVICE_MODEL="Nokia", HTTP_USER_AGENT="agent")
+            User.objects.create_user("jsmith", "jsmith@example.com", self.password)
+            other = client.post("/auth-token/", {"username": "jsmith", "password": self.password}, format="json").data
+            self.assertNotEqual(other["device_id"], first["device_id"])
+            self.assertEqual(Device.objects.count(), 2)
+
+    @override_settings(JWT_DEVICES={"JWT_DEVICES_MAX_PER_USER": 2})
+    def test_max_devices_per_user(self):
+        client = APIClient()
+        with freeze_time("2016-01-01 00:00:00") as frozen_time:
+            device_ids = []
+            for _ in range(3):
+                device_ids.append(client.post("/auth-token/", self.data, format="json").data["device_id"])
+                frozen_time.tick(delta=timedelta(minutes=1))
+            self.assertEqual(set(Device.objects.values_list("id", flat=True)), set(device_ids[1:]))
+
+            # the least recently used device is evicted, even though it is not the oldest one
+            Device.objects.filter(pk=device_ids[1]).update(last_request_datetime=datetime.now())
+            frozen_time.tick(delta=timedelta(minutes=1))
+            device_ids.append(client.post("/auth-token/", self.data, format="json").data["device_id"])
+            self.assertEqual(set(Device.objects.values_list("id", flat=True)), {device_ids[1], device_ids[3]})
+
+            evict_oldest = {"JWT_DEVICES_MAX_PER_USER": 2, "JWT_DEVICES_EVICTION_POLICY": "oldest"}
+            with override_settings(JWT_DEVICES=evict_oldest):
+                device_ids.append(client.post("/auth-token/", self.data, format="json").data["device_id"])
+            self.assertEqual(set(Device.objects.values_list("id", flat=True)), {device_ids[3], device_ids[4]})
+
+    @override_settings(JWT_DEVICES={"JWT_PERMANENT_TOKEN_AUTH": False})
     def test_default_auth(self):
         # the app should allow using the old-style authentication
-        api_settings.JWT_PERMANENT_TOKEN_AUTH = False
         client = APIClient()
         client.credentials(HTTP_X_DEVICE_MODEL="Nokia", HTTP_USER_AGENT="agent")
         self.assertEqual(Device.objects.all().count(), 0)
@@ -69,7 +130,6 @@ class ObtainJSONWebTokenTests(BaseTestCase):
         client.login(**self.data)
         response = client.get("/devices/", format="json")
         self.assertEqual(response.status_code, 200)
-        api_settings.JWT_PERMANENT_TOKEN_AUTH = True
 
 
 class DeviceLogoutViewTests(BaseTestCase):
@@ -135,6 +195,50 @@ class DeviceLogoutViewTests(BaseTestCase):
         self.assertEqual(Device.objects.all().count(), 0)
 
 
+class RecordingSecretStore(LocalMemorySecretStore):
+    invalidated = []
+
+    def invalidate_many(self, device_ids):
+        self.invalidated.append(set(device_ids))
+        super(RecordingSecretStore, self).invalidate_many(device_ids)
+
+
+class DeviceBulkLogoutViewTests(BaseTestCase):
+    jwt_devices_settings = {"JWT_DEVICES_SECRET_STORE": RecordingSecretStore}
+
+    def setUp(self):
+        super(DeviceBulkLogoutViewTests, self).setUp()
+        RecordingSecretStore.invalidated = []
+        self.client = APIClient()
+        self.devices = [self.client.post("/auth-token/", self.data, format="json").data for _ in range(3)]
+        self.user2 = User.objects.create_user("jsmith", "jsmith@example.com", self.password)
+        self.other_device = Device.objects.create(user=self.user2, name="Android")
+        self.client.credentials(HTTP_AUTHORIZATION="JWT {}".format(self.devices[0]["token"]))
+
+    def test_logout_all_but_current(self):
+        response = self.client.post("/device-bulk-logout/", {"keep_current": True}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertEqual(
+            set(Device.objects.values_list("id", flat=True)), {self.devices[0]["device_id"], self.other_device.id})
+        # the secrets are invalidated at once
+        self.assertEqual(RecordingSecretStore.invalidated, [{self.devices[1]["device_id"], self.devices[2]["device_id"]}])
+        self.assertEqual(self.client.get("/devices/").status_code, status.HTTP_200_OK)
+
+    def test_logout_listed_devices(self):
+        ids = [self.devices[1]["device_id"], self.other_device.id]
+        response = self.client.post("/device-bulk-logout/", {"ids": ids}, format="json")
+        self.assertEqual(response.data, {"deleted": 1})
+        self.assertEqual(Device.objects.count(), 3)
+        self.assertTrue(Device.objects.filter(pk=self.other_device.id).exists())
+
+    def test_logout_everywhere(self):
+        response = self.client.post("/device-bulk-logout/", {}, format="json")
+        self.assertEqual(response.data, {"deleted": 3})
+        self.assertEqual(list(Device.objects.all()), [self.other_device])
+        self.assertEqual(self.client.get("/devices/").status_code, status.HTTP_404_NOT_FOUND)
+
+
 class DeviceRefreshTokenViewsTests(BaseTestCase):
     def setUp(self):
         super(DeviceRefreshTokenViewsTests, self).setUp()
@@ -187,6 +291,53 @@ class DeviceRefreshTokenViewsTests(BaseTestCase):
             with self.assertRaises(Device.DoesNotExist):
                 Device.objects.get(permanent_token=permanent_token)
 
+    def test_refreshing_hashed_permanent_token(self):
+        with freeze_time("2016-01-01 00:00:00") as frozen_time:
+            client = APIClient()
+            response = client.post("/auth-token/", self.data, format="json")
+            permanent_token = response.data["permanent_token"]
+            self.assertEqual(Device.objects.get(pk=response.data["device_id"]).permanent_token, permanent_token)
+
+            # the plaintext token of a device created before enabling hashing is dropped on refresh
+            with override_settings(JWT_DEVICES={"JWT_DEVICES_HASH_PERMANENT_TOKENS": True}):
+                frozen_time.tick(delta=timedelta(hours=1))
+                client.credentials(HTTP_PERMANENT_TOKEN=permanent_token)
+                response = client.post("/device-refresh-token/", format="json")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                device = Device.objects.get(permanent_token_digest=Device.hash_token(permanent_token))
+                self.assertIsNone(device.permanent_token)
+
+                client.credentials()
+                response = client.post("/auth-token/", self.data, format="json")
+                permanent_token = response.data["permanent_token"]
+                self.assertIsNone(Device.objects.get(pk=response.data["device_id"]).permanent_token)
+                client.credentials(HTTP_PERMANENT_TOKEN=permanent_token)
+                response = client.post("/device-refresh-token/", format="json")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_refreshing_query_count(self):
+        with freeze_time("2016-01-01 00:00:00") as frozen_time:
+            client = APIClient()
+            response = client.post("/auth-token/", self.data, format="json")
+            permanent_token = response.data["permanent_token"]
+            client.credentials(HTTP_PERMANENT_TOKEN=permanent_token)
+
+            # loading the device with its user and bumping last_request_datetime
+            frozen_time.tick(delta=timedelta(hours=1))
+            with self.assertNumQueries(2):
+                response = client.post("/device-refresh-token/", format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(Device.objects.get(permanent_token=permanent_token).last_request_datetime, datetime.now())
+
+            # last_request_datetime is within JWT_PERMANENT_TOKEN_EXPIRATION_ACCURACY, so it is not updated
+            frozen_time.tick(delta=timedelta(minutes=1))
+            with self.assertNumQueries(1):
+                response = client.post("/device-refresh-token/", format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                Device.objects.get(permanent_token=permanent_token).last_request_datetime,
+                datetime.now() - timedelta(minutes=1))
+
 
 class DeviceViewTests(BaseTestCase):
     def setUp(self):
@@ -233,4 +384,32 @@ class DeviceViewTests(BaseTestCase):
         self.assertEqual(set(response.data[0].keys()), {
             "id", "created", "name", "details", "last_request_datetime"
         })
-        self.assertEqual(response.data[0]["id"], self.device.id)
+        # the device created during _login() was used most recently
+        self.assertEqual(response.data[1]["id"], self.device.id)
+
+    def test_device_list_fields(self):
+        client = APIClient()
+        self._login(client)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/devices/?fields=id,name,unknown", format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data[0].keys()), {"id", "name"})
+        # the devices are loaded without the credentials and the fields not requested
+        self.assertNotIn("permanent_token", queries[-1]["sql"])
+        self.assertNotIn("jwt_secret", queries[-1]["sql"])
+        self.assertNotIn("details", queries[-1]["sql"])
+
+    def test_device_list_pagination(self):
+        with override_settings(JWT_DEVICES={"JWT_DEVICES_PAGINATION_CLASS": DeviceCursorPagination}):
+            client = APIClient()
+            self._login(client)
+            response = client.get("/devices/?page_size=1", format="json")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(set(response.data.keys()), {"next", "previous", "results"})
+            self.assertEqual(len(response.data["results"]), 1)
+            first_page_id = response.data["results"][0]["id"]
+
+            response = client.get(response.data["next"], format="json")
+            self.assertEqual([device["id"] for device in response.data["results"]], [self.device.id])
+            self.assertNotEqual(first_page_id, self.device.id)
+            self.assertIsNone(response.data["next"])
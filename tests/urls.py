@@ -10,4 +10,6 @@ urlpatterns = [
     url(r"^auth-token/$", views.obtain_jwt_token),
     url(r"^device-refresh-token/$", views.device_refresh_token),
     url(r"^device-logout/$", views.device_logout),
+    url(r"^device-bulk-logout/$", views.device_bulk_logout),
+    url(r"^jwks/$", views.json_web_key_set),
 ] + router.urls